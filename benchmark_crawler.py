@@ -0,0 +1,184 @@
+# benchmark_crawler.py
+"""
+批次下載基準測試
+用途：以本機模擬伺服器（mock_aedyn_server.py）量測 PortWeatherCrawler 在大量港口下的整體耗時、
+請求速率與重新登入行為，不需連線正式環境
+
+每個規模各執行兩次批次下載：
+    首次：資料庫是空的，所有站點都要下載
+    重複：伺服器內容未變，爬蟲帶 If-None-Match，應大多收到 304
+
+使用方式：
+    python benchmark_crawler.py                               # 100 / 1,000 / 10,000 個合成港口
+    python benchmark_crawler.py --ports 500 --latency 0.1 --unauthorized-rate 0.01
+    python benchmark_crawler.py --async --unlimited           # asyncio 版本，不受限速器限制
+"""
+
+import io
+import os
+import sys
+import argparse
+import tempfile
+import time
+from contextlib import redirect_stdout
+from typing import Any, Dict, List
+
+from mock_aedyn_server import MockAedynServer, load_bulletins
+
+DEFAULT_PORT_COUNTS = [100, 1000, 10000]
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+DB_FILE = os.path.join(PROJECT_DIR, 'WNI_port_weather.db')
+
+
+def build_ports(count: int) -> Dict[str, Dict[str, Any]]:
+    """
+    產生合成港口清單（每個港口一個站點，模擬伺服器會把未知站點固定對應到資料庫中的某份氣象內容）
+
+    Args:
+        count: 港口數
+
+    Returns:
+        Dict[港口代碼, 港口資訊]（格式同 PortWeatherCrawler.port_map）
+    """
+    return {
+        f"BM{i:05d}": {
+            'id': f"BENCH{i:05d}",
+            'name': f"Bench Port {i}",
+            'wni_code': f"BM{i:05d}",
+            'country': 'N/A',
+            'latitude': 0.0,
+            'longitude': 0.0
+        }
+        for i in range(count)
+    }
+
+
+def run_benchmark(wni_crawler: Any, server: MockAedynServer, count: int,
+                  args: argparse.Namespace) -> List[Dict[str, Any]]:
+    """
+    以指定港口數執行首次與重複兩次批次下載
+
+    Args:
+        wni_crawler: 已指向模擬伺服器的 wni_crawler 模組
+        server: 模擬伺服器
+        count: 港口數
+        args: 命令列參數
+
+    Returns:
+        List[Dict]: 兩次批次下載的量測結果
+    """
+    crawler_cls = wni_crawler.AsyncPortWeatherCrawler if args.use_async else wni_crawler.PortWeatherCrawler
+    fetch_kwargs = {'use_schedule': False}
+    if args.workers:
+        fetch_kwargs['max_workers'] = args.workers
+    output = sys.stdout if args.verbose else io.StringIO()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = wni_crawler.WeatherDatabase(os.path.join(tmp_dir, 'benchmark.db'))
+        with redirect_stdout(output):
+            # 不提供 Excel，港口清單改用合成資料；auto_login 讓每個規模都從一次完整登入開始
+            crawler = crawler_cls(server.username, server.password,
+                                  excel_path=os.path.join(tmp_dir, 'ports.xlsx'), auto_login=True,
+                                  db=db, cookie_file=os.path.join(tmp_dir, 'cookies.pkl'))
+        for code, info in build_ports(count).items():
+            crawler.port_map[code] = info
+            crawler.port_list.append(code)
+        if args.unlimited:
+            crawler.rate_limiter.rate = crawler.rate_limiter.max_rate = 1e9
+
+        try:
+            for label in ('首次', '重複'):
+                server_before = dict(server.stats)
+                logins_before = crawler.login_count
+                start = time.perf_counter()
+                with redirect_stdout(output):
+                    stats = crawler.fetch_all_ports(**fetch_kwargs)
+                elapsed = time.perf_counter() - start
+                served = {key: server.stats[key] - server_before[key] for key in server.stats}
+                metrics = crawler.fetch_metrics.summary()
+                results.append({
+                    'ports': count,
+                    'pass': label,
+                    'seconds': elapsed,
+                    'requests': served['content_requests'],
+                    'rate': served['content_requests'] / elapsed if elapsed else 0.0,
+                    'latency': metrics['latency_ms'].get('total_ms', {}),
+                    'stats': stats,
+                    'served': served,
+                    'relogins': crawler.login_count - logins_before,
+                })
+        finally:
+            crawler.stop_token_refresh()
+            db.close()
+    return results
+
+
+def print_results(results: List[Dict[str, Any]]) -> None:
+    """輸出量測結果表格與登入統計"""
+    print("\n" + "=" * 96)
+    print(f"   {'港口數':>7} {'批次':<4} {'耗時(s)':>8} {'請求數':>7} {'請求/秒':>8} "
+          f"{'p50(ms)':>8} {'p95(ms)':>8} {'成功':>6} {'略過':>6} {'失敗':>5} {'304':>6}")
+    print("=" * 96)
+    for r in results:
+        latency, stats = r['latency'], r['stats']
+        print(f"   {r['ports']:>7,} {r['pass']:<4} {r['seconds']:>8.2f} {r['requests']:>7,} {r['rate']:>8.1f} "
+              f"{latency.get('p50', 0):>8.1f} {latency.get('p95', 0):>8.1f} "
+              f"{stats['success']:>6} {stats['skip']:>6} {stats['fail']:>5} {r['served']['not_modified']:>6}")
+
+    print("\n🔐 重新登入")
+    for r in results:
+        served = r['served']
+        print(f"   {r['ports']:>7,} 港口 {r['pass']}: 爬蟲重新登入 {r['relogins']} 次，"
+              f"伺服器登入 {served['logins']} 次，"
+              f"401 {served['unauthorized'] + served['injected_unauthorized']} 次"
+              f"（注入 {served['injected_unauthorized']}），503 注入 {served['injected_errors']} 次")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='以本機模擬伺服器量測批次下載效能')
+    parser.add_argument('--ports', type=int, nargs='+', default=DEFAULT_PORT_COUNTS, help='合成港口數（可指定多個）')
+    parser.add_argument('--db', default=DB_FILE, help='提供氣象內容的資料庫')
+    parser.add_argument('--latency', type=float, default=0.05, help='模擬伺服器每個回應的延遲秒數')
+    parser.add_argument('--jitter', type=float, default=0.0, help='額外隨機延遲的上限秒數')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='回應 503 的機率')
+    parser.add_argument('--unauthorized-rate', type=float, default=0.0, help='注入 401 的機率')
+    parser.add_argument('--token-ttl', type=int, default=3600, help='JWT 有效秒數（調短可觀察主動更新）')
+    parser.add_argument('--seed', type=int, default=1, help='亂數種子')
+    parser.add_argument('--async', dest='use_async', action='store_true', help='使用 AsyncPortWeatherCrawler')
+    parser.add_argument('--workers', type=int, default=None, help='同時下載數（預設沿用爬蟲的設定）')
+    parser.add_argument('--unlimited', action='store_true', help='解除限速器上限，量測爬蟲本身的極限')
+    parser.add_argument('--verbose', action='store_true', help='顯示爬蟲的輸出')
+    args = parser.parse_args()
+
+    bulletins = load_bulletins(args.db)
+    if not bulletins:
+        print(f"❌ {args.db} 中沒有氣象內容，無法提供模擬資料")
+        return
+
+    server = MockAedynServer(token_ttl=args.token_ttl, bulletins=bulletins, latency=args.latency,
+                             jitter=args.jitter, error_rate=args.error_rate,
+                             unauthorized_rate=args.unauthorized_rate, seed=args.seed)
+    with server:
+        # wni_crawler 在匯入時讀取網址設定，必須先設好環境變數
+        os.environ['AEDYN_BASE_URL'] = server.base_url
+        os.environ['AEDYN_LOGIN_URL'] = server.login_url
+        os.environ['AEDYN_LOGIN_BACKEND'] = 'http'
+        import wni_crawler
+
+        print("=" * 60)
+        print(f"🏁 批次下載基準測試（{'asyncio' if args.use_async else '執行緒'}版本）")
+        print("=" * 60)
+        print(f"   模擬伺服器: {server.base_url}（{len(bulletins)} 份氣象內容）")
+        print(f"   延遲 {args.latency}s（+0~{args.jitter}s），503 機率 {args.error_rate}，401 機率 {args.unauthorized_rate}")
+        print(f"   限速器: {'解除' if args.unlimited else '預設'}")
+
+        results = []
+        for count in args.ports:
+            print(f"\n⏳ {count:,} 個港口...")
+            results.extend(run_benchmark(wni_crawler, server, count, args))
+        print_results(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+# benchmark_startup.py
+"""
+啟動時間基準測試
+用途：量測各相依套件的匯入成本，以及 wni_crawler / n8n_weather_monitor 啟動時實際載入了哪些套件
+
+使用方式：
+    python benchmark_startup.py              # 預設每個模組量測 5 次取中位數
+    python benchmark_startup.py --repeat 10
+"""
+
+import os
+import sys
+import argparse
+import statistics
+import subprocess
+import time
+from typing import Dict, List, Tuple
+
+# 量測的匯入敘述（第三方相依套件，selenium 以登入時實際用到的子模組為準）
+DEPENDENCIES = [
+    'import requests',
+    'import urllib3',
+    'import sqlite3',
+    'import numpy',
+    'import pandas',
+    'import openpyxl',
+    'from selenium import webdriver; from selenium.webdriver.support.ui import WebDriverWait',
+    'import aiohttp',
+]
+PROJECT_MODULES = [
+    'weather_parser',
+    'wni_crawler',
+    'n8n_weather_monitor',
+]
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def time_import(statement: str, repeat: int) -> Tuple[float, bool]:
+    """
+    在全新的 Python 行程中執行匯入敘述並量測耗時（扣除直譯器本身的啟動時間）
+
+    Args:
+        statement: 匯入敘述
+        repeat: 重複次數
+
+    Returns:
+        Tuple[中位數耗時（毫秒）, 是否匯入成功]
+    """
+    def run(code: str) -> Tuple[float, bool]:
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, '-c', code],
+            cwd=PROJECT_DIR,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        return (time.perf_counter() - start) * 1000, result.returncode == 0
+
+    baseline = statistics.median(run('pass')[0] for _ in range(repeat))
+    samples = []
+    for _ in range(repeat):
+        elapsed, ok = run(statement)
+        if not ok:
+            return 0.0, False
+        samples.append(elapsed)
+    return max(0.0, statistics.median(samples) - baseline), True
+
+
+def import_breakdown(module: str) -> List[Tuple[str, float]]:
+    """
+    以 python -X importtime 取得模組直接匯入的各套件累計耗時
+
+    Args:
+        module: 模組名稱
+
+    Returns:
+        List[Tuple[套件名稱, 累計耗時（毫秒）]]，由大到小排序
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=PROJECT_DIR,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True
+    )
+
+    # 子模組會先於父模組輸出，且每深一層多縮排兩格
+    children: Dict[str, float] = {}
+    for line in result.stderr.splitlines():
+        # 格式: "import time:   self [us] | cumulative | imported package"
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line.split('|')
+        if not cumulative.strip().isdigit():
+            continue
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 0:
+            if name.strip() == module:
+                return sorted(children.items(), key=lambda x: x[1], reverse=True)
+            children = {}
+        elif depth == 1:
+            package = name.strip().split('.')[0]
+            children[package] = children.get(package, 0.0) + int(cumulative) / 1000
+
+    return []
+
+
+def main():
+    parser = argparse.ArgumentParser(description='量測相依套件的匯入成本')
+    parser.add_argument('--repeat', type=int, default=5, help='每個模組量測次數（取中位數）')
+    parser.add_argument('--top', type=int, default=10, help='匯入明細顯示前幾名')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"⏱️  匯入成本（扣除直譯器啟動，{args.repeat} 次中位數）")
+    print("=" * 60)
+
+    statements = DEPENDENCIES + [f'import {module}' for module in PROJECT_MODULES]
+    for statement in statements:
+        elapsed, ok = time_import(statement, args.repeat)
+        label = statement if len(statement) <= 40 else statement[:37] + '...'
+        if ok:
+            print(f"   {label:<40} {elapsed:8.1f} ms")
+        else:
+            print(f"   {label:<40}      未安裝或匯入失敗")
+
+    for module in PROJECT_MODULES[1:]:
+        print("\n" + "=" * 60)
+        print(f"📦 import {module} 實際載入的頂層套件（前 {args.top} 名）")
+        print("=" * 60)
+        for package, elapsed in import_breakdown(module)[:args.top]:
+            print(f"   {package:<40} {elapsed:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
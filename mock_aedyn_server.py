@@ -0,0 +1,582 @@
+# mock_aedyn_server.py
+"""
+Aedyn 本機模擬伺服器
+用途：不連線正式環境即可測試 HTTP 登入流程與批次下載
+模擬 Keycloak（implicit flow 登入頁、SSO session）與 Aedyn 前端的 mod_auth_openidc（redirect_uri、session Cookie），
+並以 WNI_port_weather.db 中的氣象內容提供港口氣象 API（可設定延遲、錯誤率與 401 注入）
+
+使用方式：
+    python mock_aedyn_server.py --port 8900 --username demo --password demo
+    python mock_aedyn_server.py --latency 0.05 --error-rate 0.02 --unauthorized-rate 0.01
+    # 依啟動時印出的網址設定環境變數後執行爬蟲
+    set AEDYN_BASE_URL=http://127.0.0.1:8900
+    set AEDYN_LOGIN_URL=http://127.0.0.1:8900/auth/realms/aedyn/protocol/openid-connect/auth?...
+"""
+
+import sys
+import json
+import time
+import zlib
+import hmac
+import random
+import sqlite3
+import base64
+import hashlib
+import secrets
+import argparse
+import threading
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlencode, urlparse, parse_qsl, quote
+
+REALM_PATH = '/auth/realms/aedyn'
+AUTH_PATH = REALM_PATH + '/protocol/openid-connect/auth'
+AUTHENTICATE_PATH = REALM_PATH + '/login-actions/authenticate'
+REDIRECT_PATH = '/httpd-auth/redirect_uri'
+SSO_COOKIE = 'KEYCLOAK_SESSION'
+APP_COOKIE = 'mod_auth_openidc_session'
+STATE_COOKIE_PREFIX = 'mod_auth_openidc_state_'
+CONTENT_PATH_PREFIX = '/api/business/sea/portstatus/content/48h/'
+DB_FILE = 'WNI_port_weather.db'
+
+LOGIN_PAGE = """<!DOCTYPE html>
+<html><head><title>Sign in to aedyn</title></head>
+<body>
+{error}
+<form id="kc-form-login" onsubmit="login.disabled = true; return true;" action="{action}" method="post">
+    <input tabindex="1" id="username" name="username" type="text" autofocus autocomplete="off" />
+    <input tabindex="2" id="password" name="password" type="password" autocomplete="off" />
+    <input type="hidden" id="id-hidden-input" name="credentialId" />
+    <input tabindex="4" name="login" id="kc-login" type="submit" value="Sign In" />
+</form>
+</body></html>
+"""
+
+# mod_auth_openidc 的 redirect_uri 頁面：由 JavaScript 把 fragment 轉成表單 POST
+FRAGMENT_POST_PAGE = """<!DOCTYPE html>
+<html><head><script>
+function postOnLoad() {
+    var params = {};
+    window.location.hash.substring(1).split('&').forEach(function (kv) {
+        var p = kv.split('=');
+        params[decodeURIComponent(p[0])] = decodeURIComponent(p[1] || '');
+    });
+    var form = document.createElement('form');
+    form.method = 'post';
+    form.action = window.location.pathname;
+    params['response_mode'] = 'fragment';
+    Object.keys(params).forEach(function (k) {
+        var input = document.createElement('input');
+        input.type = 'hidden'; input.name = k; input.value = params[k];
+        form.appendChild(input);
+    });
+    document.body.appendChild(form);
+    form.submit();
+}
+</script></head><body onload="postOnLoad()"><p>Submitting...</p></body></html>
+"""
+
+
+def _b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def load_bulletins(db_file: str = DB_FILE) -> Dict[str, str]:
+    """
+    從氣象資料庫讀出各站點最新的氣象內容（唯讀，不需匯入 wni_crawler）
+
+    Args:
+        db_file: 資料庫檔案路徑
+
+    Returns:
+        Dict[站點 ID, 氣象內容]；檔案不存在或沒有資料時為空
+    """
+    try:
+        conn = sqlite3.connect(f"file:{db_file}?mode=ro", uri=True)
+    except sqlite3.Error:
+        return {}
+    try:
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(weather_data)")}
+        if not columns:
+            return {}
+        # 新資料壓縮存在 bulletin_blobs，舊資料仍是 weather_data.content 明文
+        if 'content_hash' in columns:
+            rows = conn.execute("""
+                SELECT w.station_id, w.content, b.content FROM weather_data w
+                LEFT JOIN bulletin_blobs b ON b.content_hash = w.content_hash
+                ORDER BY w.issued_time
+            """).fetchall()
+        else:
+            rows = [(station_id, content, None) for station_id, content in
+                    conn.execute("SELECT station_id, content FROM weather_data ORDER BY issued_time")]
+    finally:
+        conn.close()
+
+    bulletins = {}
+    for station_id, content, blob in rows:
+        bulletins[str(station_id)] = zlib.decompress(blob).decode('utf-8') if blob is not None else content
+    return bulletins
+
+
+class _MockHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # 批次下載會同時開很多連線，預設的 5 容易被拒絕連線
+
+    def handle_error(self, request, client_address):
+        # 爬蟲讀到發布時間就中止下載時會直接斷線，不必印出 traceback
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+
+class MockAedynServer:
+    """本機模擬的 Aedyn / Keycloak 伺服器（於背景執行緒提供服務）"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, username: str = 'demo',
+                 password: str = 'demo', token_ttl: int = 3600, bulletins: Optional[Dict[str, str]] = None,
+                 latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 unauthorized_rate: float = 0.0, seed: Optional[int] = None):
+        """
+        初始化模擬伺服器
+
+        Args:
+            host: 監聽位址
+            port: 監聽埠（0 表示自動選擇）
+            username: 接受登入的帳號
+            password: 接受登入的密碼
+            token_ttl: JWT 與 session 的有效秒數
+            bulletins: 站點 ID -> 氣象內容（見 load_bulletins；未知的站點 ID 會固定對應到其中一份）
+            latency: 氣象 API 每個回應的基本延遲秒數
+            jitter: 額外延遲的上限秒數（均勻分布）
+            error_rate: 回應 503 的機率
+            unauthorized_rate: 即使憑證有效也回應 401 的機率（模擬 session 被伺服器端登出）
+            seed: 亂數種子（固定後延遲與錯誤注入可重現）
+        """
+        self.username = username
+        self.password = password
+        self.token_ttl = token_ttl
+        self.bulletins = dict(bulletins or {})
+        self._bulletin_ids: List[str] = sorted(self.bulletins)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.unauthorized_rate = unauthorized_rate
+        self._random = random.Random(seed)
+        self.secret = secrets.token_bytes(32)
+        self.stats = {
+            'logins': 0, 'failed_logins': 0, 'sessions': 0,
+            'content_requests': 0, 'not_modified': 0, 'unauthorized': 0,
+            'injected_errors': 0, 'injected_unauthorized': 0,
+        }
+        self._lock = threading.Lock()
+        self._pending_logins: Dict[str, Dict[str, str]] = {}  # session_code -> 授權請求參數
+        self._sso_sessions: Dict[str, str] = {}               # Keycloak SSO session -> 帳號
+        self._states: Dict[str, str] = {}                     # 授權 state -> 登入後返回的路徑
+        self._app_sessions: Dict[str, Dict[str, Any]] = {}    # Aedyn session -> {'user', 'expires'}
+        self.httpd = _MockHTTPServer((host, port), self._handler_class())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def redirect_uri(self) -> str:
+        return self.base_url + REDIRECT_PATH
+
+    @property
+    def login_url(self) -> str:
+        """與正式環境 LOGIN_URL 相同格式的登入網址（state 為固定值，不會被 redirect_uri 接受）"""
+        return self._authorize_url('cZr_CP7VqEq2p8j6D_a_YrL2ucA')
+
+    def _authorize_url(self, state: str) -> str:
+        return (
+            f"{self.base_url}{AUTH_PATH}"
+            f"?response_type=id_token%20token&scope=openid&client_id=aedyn"
+            f"&state={state}&redirect_uri={quote(self.redirect_uri, safe='')}"
+            f"&nonce={secrets.token_urlsafe(16)}"
+        )
+
+    def issue_jwt(self, username: str, ttl: Optional[int] = None) -> str:
+        """
+        簽發 HS256 JWT
+
+        Args:
+            username: 帳號
+            ttl: 有效秒數（預設 token_ttl）
+
+        Returns:
+            str: JWT 字串
+        """
+        now = int(time.time())
+        header = _b64url(json.dumps({'alg': 'HS256', 'typ': 'JWT'}).encode())
+        payload = _b64url(json.dumps({
+            'sub': username,
+            'iat': now,
+            'exp': now + (self.token_ttl if ttl is None else ttl)
+        }).encode())
+        signature = hmac.new(self.secret, f"{header}.{payload}".encode(), hashlib.sha256).digest()
+        return f"{header}.{payload}.{_b64url(signature)}"
+
+    def verify_jwt(self, token: str) -> Optional[str]:
+        """
+        驗證 JWT 簽章與有效期限
+
+        Args:
+            token: JWT 字串
+
+        Returns:
+            str: 有效時返回帳號，否則 None
+        """
+        try:
+            header, payload, signature = token.split('.')
+            expected = hmac.new(self.secret, f"{header}.{payload}".encode(), hashlib.sha256).digest()
+            if not hmac.compare_digest(_b64url(expected), signature):
+                return None
+            claims = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+            if claims.get('exp', 0) <= time.time():
+                return None
+            return claims.get('sub')
+        except Exception:
+            return None
+
+    def start(self) -> 'MockAedynServer':
+        """於背景執行緒啟動伺服器"""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """停止伺服器"""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self) -> 'MockAedynServer':
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.stop()
+
+    def revoke_credentials(self) -> None:
+        """讓所有 session 與已簽發的 JWT 立即失效（模擬伺服器端登出，用來觸發 401）"""
+        with self._lock:
+            self._app_sessions.clear()
+            self.secret = secrets.token_bytes(32)
+
+    def count(self, name: str) -> None:
+        """統計計數加一（處理請求的執行緒共用）"""
+        with self._lock:
+            self.stats[name] += 1
+
+    def bulletin(self, station_id: str) -> Optional[str]:
+        """
+        取得站點的氣象內容
+
+        Args:
+            station_id: 站點 ID
+
+        Returns:
+            str: 氣象內容；未知的站點 ID 依 ID 固定對應到其中一份（供大量合成港口使用），沒有任何資料時為 None
+        """
+        content = self.bulletins.get(station_id)
+        if content is None and self._bulletin_ids:
+            content = self.bulletins[self._bulletin_ids[zlib.crc32(station_id.encode()) % len(self._bulletin_ids)]]
+        return content
+
+    def draw_fault(self) -> Optional[str]:
+        """
+        依 error_rate / unauthorized_rate 抽出這次請求要注入的錯誤
+
+        Returns:
+            str: 'error' / 'unauthorized'，不注入時為 None
+        """
+        with self._lock:
+            roll = self._random.random()
+        if roll < self.error_rate:
+            return 'error'
+        if roll < self.error_rate + self.unauthorized_rate:
+            return 'unauthorized'
+        return None
+
+    def response_delay(self) -> float:
+        """氣象 API 這次回應的延遲秒數（latency 加上 0 ~ jitter 的隨機延遲）"""
+        if not self.jitter:
+            return self.latency
+        with self._lock:
+            return self.latency + self._random.uniform(0, self.jitter)
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(_MockHandler):
+            mock = server
+
+        return Handler
+
+
+class _MockHandler(BaseHTTPRequestHandler):
+    """模擬伺服器的請求處理（路由見 do_GET / do_POST）"""
+
+    mock: MockAedynServer
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    # ---------- 共用 ----------
+
+    @property
+    def path_only(self) -> str:
+        return urlparse(self.path).path
+
+    @property
+    def query(self) -> Dict[str, str]:
+        return dict(parse_qsl(urlparse(self.path).query))
+
+    @property
+    def cookies(self) -> Dict[str, str]:
+        jar = SimpleCookie(self.headers.get('Cookie', ''))
+        return {name: morsel.value for name, morsel in jar.items()}
+
+    def read_form(self) -> Dict[str, str]:
+        length = int(self.headers.get('Content-Length', 0))
+        return dict(parse_qsl(self.rfile.read(length).decode('utf-8')))
+
+    def send(self, status: int, body: str = '', content_type: str = 'text/html; charset=utf-8',
+             headers: Optional[Dict[str, str]] = None, cookies: Optional[Dict[str, Optional[str]]] = None) -> None:
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        for name, value in (cookies or {}).items():
+            # value 為 None 表示刪除 Cookie
+            attrs = 'Max-Age=0; ' if value is None else ''
+            self.send_header('Set-Cookie', f"{name}={value or ''}; {attrs}Path=/; HttpOnly")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def redirect(self, location: str, cookies: Optional[Dict[str, Optional[str]]] = None) -> None:
+        self.send(302, headers={'Location': location}, cookies=cookies)
+
+    def send_json(self, status: int, data: Any) -> None:
+        self.send(status, json.dumps(data), content_type='application/json')
+
+    def current_user(self) -> Optional[str]:
+        """以 Aedyn session Cookie 或 json_web_token header 辨識使用者"""
+        token = self.headers.get('json_web_token')
+        if token:
+            return self.mock.verify_jwt(token)
+        sid = self.cookies.get(APP_COOKIE)
+        with self.mock._lock:
+            session = self.mock._app_sessions.get(sid)
+            if session and session['expires'] > time.time():
+                return session['user']
+        return None
+
+    # ---------- 路由 ----------
+
+    def do_GET(self):
+        path = self.path_only
+        if path == AUTH_PATH:
+            self.handle_authorize()
+        elif path == REDIRECT_PATH:
+            self.send(200, FRAGMENT_POST_PAGE)
+        elif path == '/api/account/user':
+            self.handle_account_user()
+        elif path.startswith(CONTENT_PATH_PREFIX) and path.endswith('.txt'):
+            self.handle_port_content(path[len(CONTENT_PATH_PREFIX):-len('.txt')])
+        else:
+            self.handle_app_page()
+
+    def do_POST(self):
+        path = self.path_only
+        if path == AUTHENTICATE_PATH:
+            self.handle_authenticate()
+        elif path == REDIRECT_PATH:
+            self.handle_redirect_uri()
+        else:
+            self.send(404, 'Not Found')
+
+    # ---------- Keycloak ----------
+
+    def handle_authorize(self):
+        params = self.query
+        if not params.get('redirect_uri') or 'id_token' not in params.get('response_type', ''):
+            self.send(400, 'Invalid parameter: redirect_uri / response_type')
+            return
+
+        # 已有 SSO session：直接轉址回 redirect_uri
+        with self.mock._lock:
+            user = self.mock._sso_sessions.get(self.cookies.get(SSO_COOKIE, ''))
+        if user:
+            self.redirect(self.token_redirect(params, user))
+            return
+
+        session_code = secrets.token_urlsafe(16)
+        with self.mock._lock:
+            self.mock._pending_logins[session_code] = params
+        self.send_login_page(session_code)
+
+    def send_login_page(self, session_code: str, error: str = '') -> None:
+        action = (
+            f"{self.mock.base_url}{AUTHENTICATE_PATH}?"
+            + urlencode({'session_code': session_code, 'execution': 'mock', 'client_id': 'aedyn', 'tab_id': 'mock'})
+        ).replace('&', '&amp;')
+        error_html = f'<span id="input-error">{error}</span>' if error else ''
+        self.send(200, LOGIN_PAGE.format(action=action, error=error_html))
+
+    def handle_authenticate(self):
+        session_code = self.query.get('session_code', '')
+        form = self.read_form()
+        with self.mock._lock:
+            params = self.mock._pending_logins.pop(session_code, None)
+        if params is None:
+            self.send(400, 'Your login attempt timed out.')
+            return
+
+        if form.get('username') != self.mock.username or form.get('password') != self.mock.password:
+            self.mock.count('failed_logins')
+            new_code = secrets.token_urlsafe(16)
+            with self.mock._lock:
+                self.mock._pending_logins[new_code] = params
+            self.send_login_page(new_code, 'Invalid username or password.')
+            return
+
+        self.mock.count('logins')
+        sso = secrets.token_urlsafe(16)
+        with self.mock._lock:
+            self.mock._sso_sessions[sso] = form['username']
+        self.redirect(self.token_redirect(params, form['username']), cookies={SSO_COOKIE: sso})
+
+    def token_redirect(self, params: Dict[str, str], user: str) -> str:
+        """implicit flow：token 放在 redirect_uri 的 fragment"""
+        fragment = urlencode({
+            'state': params.get('state', ''),
+            'session_state': secrets.token_hex(8),
+            'id_token': self.mock.issue_jwt(user),
+            'access_token': self.mock.issue_jwt(user),
+            'token_type': 'bearer',
+            'expires_in': self.mock.token_ttl,
+        })
+        return f"{params['redirect_uri']}#{fragment}"
+
+    # ---------- Aedyn（mod_auth_openidc） ----------
+
+    def handle_redirect_uri(self):
+        form = self.read_form()
+        state = form.get('state', '')
+        user = self.mock.verify_jwt(form.get('id_token', ''))
+        with self.mock._lock:
+            return_to = self.mock._states.get(state)
+        # state 必須是本站發起授權時設定的（對應 state Cookie），否則拒絕
+        if return_to is None or STATE_COOKIE_PREFIX + state not in self.cookies or not user:
+            self.send(401, 'mod_auth_openidc: state mismatch or invalid id_token')
+            return
+
+        sid = secrets.token_urlsafe(24)
+        with self.mock._lock:
+            self.mock._states.pop(state, None)
+            self.mock._app_sessions[sid] = {'user': user, 'expires': time.time() + self.mock.token_ttl}
+        self.mock.count('sessions')
+        self.redirect(return_to, cookies={APP_COOKIE: sid, STATE_COOKIE_PREFIX + state: None})
+
+    def handle_app_page(self):
+        user = self.current_user()
+        if user is None:
+            # 未登入：發起新的授權（state 記在 Cookie 中）
+            state = secrets.token_urlsafe(16)
+            with self.mock._lock:
+                self.mock._states[state] = self.path
+            self.redirect(self.mock._authorize_url(state), cookies={STATE_COOKIE_PREFIX + state: '1'})
+            return
+        self.send(200, '<!DOCTYPE html><html><body>aedyn</body></html>',
+                  cookies={'jwt': self.mock.issue_jwt(user)})
+
+    def handle_account_user(self):
+        user = self.current_user()
+        if user is None:
+            self.send_json(401, {'error': 'unauthorized'})
+            return
+        self.send_json(200, {'user_id': user, 'user_disp_name': user})
+
+    # ---------- 港口氣象 API ----------
+
+    def handle_port_content(self, station_id: str):
+        self.mock.count('content_requests')
+        delay = self.mock.response_delay()
+        if delay > 0:
+            time.sleep(delay)
+
+        fault = self.mock.draw_fault()
+        if fault == 'error':
+            self.mock.count('injected_errors')
+            self.send(503, 'Service Unavailable', content_type='text/plain')
+            return
+        if self.current_user() is None:
+            self.mock.count('unauthorized')
+            self.send_json(401, {'error': 'unauthorized'})
+            return
+        if fault == 'unauthorized':
+            self.mock.count('injected_unauthorized')
+            self.send_json(401, {'error': 'unauthorized'})
+            return
+
+        content = self.mock.bulletin(station_id)
+        if content is None:
+            self.send(404, 'Not Found', content_type='text/plain')
+            return
+        etag = '"' + hashlib.sha1(content.encode('utf-8')).hexdigest()[:16] + '"'
+        if self.headers.get('If-None-Match') == etag:
+            self.mock.count('not_modified')
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send(200, content, content_type='text/plain; charset=utf-8', headers={'ETag': etag})
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Aedyn 本機模擬伺服器')
+    parser.add_argument('--host', default='127.0.0.1', help='監聽位址')
+    parser.add_argument('--port', type=int, default=8900, help='監聽埠')
+    parser.add_argument('--username', default='demo', help='接受登入的帳號')
+    parser.add_argument('--password', default='demo', help='接受登入的密碼')
+    parser.add_argument('--token-ttl', type=int, default=3600, help='JWT 與 session 的有效秒數')
+    parser.add_argument('--db', default=DB_FILE, help='提供氣象內容的資料庫')
+    parser.add_argument('--latency', type=float, default=0.0, help='氣象 API 每個回應的延遲秒數')
+    parser.add_argument('--jitter', type=float, default=0.0, help='額外隨機延遲的上限秒數')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='回應 503 的機率')
+    parser.add_argument('--unauthorized-rate', type=float, default=0.0, help='注入 401 的機率')
+    parser.add_argument('--seed', type=int, default=None, help='亂數種子')
+    args = parser.parse_args()
+
+    bulletins = load_bulletins(args.db)
+    server = MockAedynServer(args.host, args.port, args.username, args.password, args.token_ttl,
+                             bulletins=bulletins, latency=args.latency, jitter=args.jitter,
+                             error_rate=args.error_rate, unauthorized_rate=args.unauthorized_rate, seed=args.seed)
+    print("=" * 60)
+    print("🧪 Aedyn 模擬伺服器已啟動")
+    print("=" * 60)
+    print(f"   AEDYN_BASE_URL={server.base_url}")
+    print(f"   AEDYN_LOGIN_URL={server.login_url}")
+    print(f"   帳號 / 密碼: {args.username} / {args.password}")
+    print(f"   氣象內容: {len(bulletins)} 個站點（{args.db}）")
+    print(f"   延遲 {args.latency}s（+0~{args.jitter}s），503 機率 {args.error_rate}，401 機率 {args.unauthorized_rate}")
+    print("   按 Ctrl+C 結束")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
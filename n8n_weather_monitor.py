@@ -2,12 +2,19 @@
 """
 N8N 自動化氣象監控腳本（基於 Streamlit App 架構）
 用途：每天自動抓取港口天氣，分析高風險港口，並發送到 Teams
+
+選用功能（環境變數）：
+    EARLY_ALERT=1    上次有風險的港口下載完成後先發送一張快報，完整警報仍在最後發送
+    USE_SCHEDULE=1   略過推估下一次發布尚未到期的港口
 """
 
 import os
 import sys
 import json
+import argparse
 import requests
+import threading
+import time
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional, Tuple
 from dataclasses import dataclass, asdict
@@ -15,7 +22,7 @@ import traceback
 import sqlite3
 
 # 導入自定義模組
-from wni_crawler import PortWeatherCrawler, WeatherDatabase
+from wni_crawler import PortWeatherCrawler, WeatherDatabase, Deadline, RETENTION_FULL_DAYS, RETENTION_DAILY_DAYS
 from weather_parser import WeatherParser, WeatherRecord
 from constant import (
     HIGH_WIND_SPEED_kts, HIGH_WIND_SPEED_Bft,
@@ -30,6 +37,17 @@ AEDYN_PASSWORD = os.getenv('AEDYN_PASSWORD', 'wanhai888')
 TEAMS_WEBHOOK_URL = os.getenv('TEAMS_WEBHOOK_URL', 'https://default2b20eccf1c1e43ce93400edfe3a226.6f.environment.api.powerplatform.com:443/powerautomate/automations/direct/workflows/65ec3ae244bf4489b02b7bb6a52b42f5/triggers/manual/paths/invoke?api-version=1&sp=%2Ftriggers%2Fmanual%2Frun&sv=1.0&sig=YBZsB6XYwTDMighYOKnQqsIf4dVAUYTKyVTtWhhUQfY')
 EXCEL_FILE_PATH = os.getenv('EXCEL_FILE_PATH', 'WHL_all_ports_list.xlsx')
 DB_FILE_PATH = os.getenv('DB_FILE_PATH', 'WNI_port_weather.db')
+HISTORY_FULL_DAYS = int(os.getenv('HISTORY_FULL_DAYS', RETENTION_FULL_DAYS))     # 保留所有發布的天數
+HISTORY_DAILY_DAYS = int(os.getenv('HISTORY_DAILY_DAYS', RETENTION_DAILY_DAYS))  # 之後每天保留一筆的天數
+HEDGE_REQUESTS = os.getenv('HEDGE_REQUESTS', '0') == '1'  # 回應過慢的站點是否再送一份請求
+RUN_BUDGET_SECONDS = float(os.getenv('RUN_BUDGET_SECONDS', '1200'))  # 整次執行的時間預算（0 表示不限制）
+POST_DOWNLOAD_RESERVE_SECONDS = 60  # 下載階段必須留給分析、通知與報告的秒數
+NOTIFY_RESERVE_SECONDS = 30         # 分析階段必須留給 Teams 通知的秒數
+NOTIFY_TIMEOUT = 30                 # Teams 通知的逾時秒數
+NOTIFY_MIN_TIMEOUT = 5              # 預算用完時 Teams 通知仍保留的最短逾時
+# 上次有風險的港口更新完就先發送 Teams 快報（預設關閉：開啟後會多發一張卡片；設定 EARLY_ALERT=1 啟用）
+EARLY_ALERT = os.getenv('EARLY_ALERT', '0') == '1'
+USE_SCHEDULE = os.getenv('USE_SCHEDULE', '0') == '1'  # 是否略過推估下一次發布尚未到期的港口（預設每次全部下載）
 
 # 風險閾值（與 Streamlit App 一致）
 RISK_THRESHOLDS = {
@@ -64,6 +82,7 @@ class RiskAssessment:
     issued_time: str
     latitude: float
     longitude: float
+    stale: bool = False  # 本次超過時間預算未更新，分析的是資料庫中的舊資料
     
     def to_dict(self) -> Dict[str, Any]:
         """轉換為字典"""
@@ -167,7 +186,8 @@ class WeatherRiskAnalyzer:
 
     @classmethod
     def analyze_port_risk(cls, port_code: str, port_info: Dict[str, Any],
-                         content: str, issued_time: str) -> Optional[RiskAssessment]:
+                         content: str, issued_time: str,
+                         records: Optional[List[WeatherRecord]] = None) -> Optional[RiskAssessment]:
         """
         分析單一港口的風險
         
@@ -176,13 +196,17 @@ class WeatherRiskAnalyzer:
             port_info: 港口資訊
             content: 氣象內容
             issued_time: 發布時間
+            records: 資料庫中已解析的氣象記錄（有提供時不再解析 content）
             
         Returns:
             RiskAssessment 或 None
         """
         try:
-            parser = WeatherParser()
-            port_name, records, warnings = parser.parse_content(content)
+            if records:
+                port_name = port_info.get('port_name', port_code)
+            else:
+                parser = WeatherParser()
+                port_name, records, warnings = parser.parse_content(content)
             
             if not records:
                 return None
@@ -265,12 +289,15 @@ class TeamsNotifier:
     def __init__(self, webhook_url: str):
         self.webhook_url = webhook_url
     
-    def send_risk_alert(self, risk_assessments: List[RiskAssessment]) -> bool:
+    def send_risk_alert(self, risk_assessments: List[RiskAssessment], timeout: float = NOTIFY_TIMEOUT,
+                        early: bool = False) -> bool:
         """
         發送風險警報到 Teams
         
         Args:
             risk_assessments: 風險評估結果列表
+            timeout: 發送逾時秒數
+            early: 是否為先行快報（只含上次有風險的港口，完整報告稍後發送）
             
         Returns:
             bool: 發送成功返回 True
@@ -279,25 +306,30 @@ class TeamsNotifier:
             print("⚠️ 未設定 Teams Webhook URL")
             return False
         
+        if early and not risk_assessments:
+            print("ℹ️ 上次有風險的港口已全部解除，不發送先行快報")
+            return False
+        
         if not risk_assessments:
             print("ℹ️ 沒有需要通知的高風險港口")
             # 發送「全部安全」的通知
-            return self._send_all_safe_notification()
+            return self._send_all_safe_notification(timeout)
         
         try:
             # 建立 Adaptive Card 訊息
-            card = self._create_adaptive_card(risk_assessments)
+            card = self._create_adaptive_card(risk_assessments, early)
             
             # 發送到 Teams
             response = requests.post(
                 self.webhook_url,
                 json=card,
                 headers={'Content-Type': 'application/json'},
-                timeout=30
+                timeout=timeout
             )
             
             if response.status_code == 200:
-                print(f"✅ 成功發送 Teams 通知 ({len(risk_assessments)} 個高風險港口)")
+                label = "先行快報" if early else "通知"
+                print(f"✅ 成功發送 Teams {label} ({len(risk_assessments)} 個高風險港口)")
                 return True
             else:
                 print(f"❌ Teams 通知發送失敗 (HTTP {response.status_code})")
@@ -309,7 +341,7 @@ class TeamsNotifier:
             traceback.print_exc()
             return False
     
-    def _send_all_safe_notification(self) -> bool:
+    def _send_all_safe_notification(self, timeout: float = NOTIFY_TIMEOUT) -> bool:
         """發送「全部港口安全」的通知"""
         try:
             card = {
@@ -369,7 +401,7 @@ class TeamsNotifier:
                 self.webhook_url,
                 json=card,
                 headers={'Content-Type': 'application/json'},
-                timeout=30
+                timeout=timeout
             )
             
             return response.status_code == 200
@@ -378,8 +410,8 @@ class TeamsNotifier:
             print(f"❌ 發送安全通知時發生錯誤: {e}")
             return False
     
-    def _create_adaptive_card(self, risk_assessments: List[RiskAssessment]) -> Dict[str, Any]:
-        """建立 Adaptive Card 格式的訊息（分區顯示）"""
+    def _create_adaptive_card(self, risk_assessments: List[RiskAssessment], early: bool = False) -> Dict[str, Any]:
+        """建立 Adaptive Card 格式的訊息（分區顯示；early 為先行快報）"""
         
         # 依風險等級分組
         danger_ports = [r for r in risk_assessments if r.risk_level == 3]
@@ -401,6 +433,8 @@ class TeamsNotifier:
             summary_parts.append(f"🟡 注意: {len(caution_ports)} 個港口")
         
         summary = " | ".join(summary_parts)
+        if early:
+            summary += "\n\n先行通知上次有風險的港口，完整報告稍後發送"
         
         # 建立卡片主體
         body = [
@@ -410,7 +444,7 @@ class TeamsNotifier:
                 "items": [
                     {
                         "type": "TextBlock",
-                        "text": "⚠️ WHL 海技部：港口氣象風險警報",
+                        "text": "⚡ WHL 海技部：港口氣象風險快報" if early else "⚠️ WHL 海技部：港口氣象風險警報",
                         "weight": "Bolder",
                         "size": "ExtraLarge"
                     },
@@ -624,6 +658,16 @@ class TeamsNotifier:
             ]
         }
         
+        if assessment.stale:
+            container["items"].append({
+                "type": "TextBlock",
+                "text": f"⏳ 本次未能及時更新，以下為 {assessment.issued_time} 發布的資料",
+                "color": "Warning",
+                "size": "Small",
+                "wrap": True,
+                "spacing": "Small"
+            })
+        
         # 如果有高風險時段，顯示前 3 個
         if assessment.risk_periods:
             period_items = []
@@ -673,43 +717,112 @@ class WeatherMonitorService:
     
     def __init__(self, username: str, password: str,
                  teams_webhook_url: str = '',
-                 excel_path: str = EXCEL_FILE_PATH):
-        """初始化監控服務"""
+                 excel_path: str = EXCEL_FILE_PATH,
+                 deadline: Optional[Deadline] = None):
+        """
+        初始化監控服務
+        
+        Args:
+            deadline: 整次執行的時間預算（初始化時的登入也受其限制）
+        """
         print("🔧 正在初始化氣象監控服務...")
         
+        # 爬蟲與分析共用同一個資料庫連線
+        self.db = WeatherDatabase(DB_FILE_PATH)
         self.crawler = PortWeatherCrawler(
             username=username,
             password=password,
             excel_path=excel_path,
-            auto_login=False
+            auto_login=False,
+            db=self.db,
+            deadline=deadline
         )
         self.analyzer = WeatherRiskAnalyzer()
         self.notifier = TeamsNotifier(teams_webhook_url)
-        self.db = WeatherDatabase()
         
         print(f"✅ 系統初始化完成，共載入 {len(self.crawler.port_list)} 個港口")
     
-    def run_daily_monitoring(self) -> Dict[str, Any]:
-        """執行每日監控"""
+    def close(self) -> None:
+        """取消背景 Token 更新並釋放資料庫連線"""
+        self.crawler.stop_token_refresh()
+        self.db.close()
+    
+    def run_daily_monitoring(self, deadline: Optional[Deadline] = None, resume: bool = False) -> Dict[str, Any]:
+        """
+        執行每日監控
+        
+        Args:
+            deadline: 整次執行的時間預算（預設為 RUN_BUDGET_SECONDS 秒）
+            resume: 是否接續上一次中斷的下載（只下載尚未完成的港口）
+        """
+        if deadline is None:
+            deadline = Deadline(RUN_BUDGET_SECONDS)
+        
         print("=" * 80)
         print(f"🚀 開始執行每日氣象監控 - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        if deadline.seconds:
+            print(f"⏱️ 時間預算: 剩餘 {deadline.remaining():.0f} 秒")
         print("=" * 80)
         
-        # 步驟 1: 下載所有港口氣象資料
+        # 步驟 1: 下載所有港口氣象資料（保留時間給後續步驟，來不及的港口沿用舊資料）
+        # 上次有風險的港口最先下載，全部更新後在背景先發送快報
         print("\n📡 步驟 1: 下載所有港口氣象資料...")
-        download_stats = self.crawler.fetch_all_ports()
+        started = time.perf_counter()
+        early_alert: Dict[str, Any] = {}
+        early_threads: List[threading.Thread] = []
+        
+        def on_priority_done(port_codes: List[str]) -> None:
+            thread = threading.Thread(
+                target=lambda: early_alert.update(self._send_early_alert(port_codes, deadline, started)),
+                name="early-alert", daemon=True
+            )
+            thread.start()
+            early_threads.append(thread)
+        
+        download_stats = self.crawler.fetch_all_ports(
+            use_schedule=USE_SCHEDULE,
+            hedge=HEDGE_REQUESTS,
+            deadline=deadline.reserve(POST_DOWNLOAD_RESERVE_SECONDS),
+            resume=resume,
+            on_priority_done=on_priority_done if EARLY_ALERT else None
+        )
+        stale_ports = list(self.crawler.stale_ports)
+        for thread in early_threads:
+            thread.join(deadline.timeout(NOTIFY_TIMEOUT, floor=NOTIFY_MIN_TIMEOUT))
         
         # 步驟 2: 分析所有港口風險
         print("\n🔍 步驟 2: 分析港口風險...")
-        risk_assessments = self._analyze_all_ports()
+        risk_assessments, unanalyzed = self._analyze_all_ports(
+            deadline.reserve(NOTIFY_RESERVE_SECONDS), set(stale_ports)
+        )
         
         # 步驟 3: 發送 Teams 通知
         print("\n📢 步驟 3: 發送 Teams 通知...")
-        notification_sent = self.notifier.send_risk_alert(risk_assessments)
+        notification_sent = self.notifier.send_risk_alert(
+            risk_assessments, timeout=deadline.timeout(NOTIFY_TIMEOUT, floor=NOTIFY_MIN_TIMEOUT)
+        )
+        
+        # 步驟 4: 資料庫維護（保留政策與壓縮）；預算用完時留待下次執行
+        print("\n🧹 步驟 4: 資料庫維護...")
+        if deadline.expired():
+            print("⏭️  已超過時間預算，略過資料庫維護")
+            maintenance = {}
+        else:
+            maintenance = self.db.run_maintenance(HISTORY_FULL_DAYS, HISTORY_DAILY_DAYS)
         
-        # 步驟 4: 生成報告
-        print("\n📊 步驟 4: 生成執行報告...")
-        report = self._generate_report(download_stats, risk_assessments, notification_sent)
+        # 步驟 5: 生成報告
+        print("\n📊 步驟 5: 生成執行報告...")
+        budget = {
+            'budget_seconds': deadline.seconds,
+            'remaining_seconds': round(deadline.remaining(), 1) if deadline.seconds else None,
+            'stale_ports': stale_ports,
+            'unanalyzed_ports': unanalyzed
+        }
+        report = self._generate_report(download_stats, risk_assessments, notification_sent, maintenance, budget)
+        report['early_alert'] = early_alert
+        if early_alert:
+            print(f"   先行快報: 下載開始後 {early_alert['seconds']} 秒"
+                  f"{'已發送' if early_alert['sent'] else '未發送'}（{early_alert['risk_ports']}/{early_alert['ports']} 個港口仍有風險）")
         
         print("\n" + "=" * 80)
         print("✅ 每日監控執行完成")
@@ -717,36 +830,91 @@ class WeatherMonitorService:
         
         return report
     
-    def _analyze_all_ports(self) -> List[RiskAssessment]:
-        """分析所有港口的風險"""
+    def _send_early_alert(self, port_codes: List[str], deadline: Deadline, started: float) -> Dict[str, Any]:
+        """
+        分析上次有風險的港口並先行發送 Teams 快報（由下載階段的 on_priority_done 在背景執行）
+        
+        Args:
+            port_codes: 上次有風險、本次已下載完成的港口代碼
+            deadline: 整次執行的時間預算
+            started: 下載開始的時間（time.perf_counter）
+            
+        Returns:
+            Dict: {'ports': n, 'risk_ports': n, 'sent': bool, 'seconds': 發送時距下載開始的秒數}
+        """
+        print(f"\n⚡ 上次有風險的 {len(port_codes)} 個港口已更新，先行分析並發送快報...")
+        risk_assessments, _ = self._analyze_all_ports(
+            stale_ports=set(self.crawler.stale_ports), port_codes=port_codes
+        )
+        sent = self.notifier.send_risk_alert(
+            risk_assessments, timeout=deadline.timeout(NOTIFY_TIMEOUT, floor=NOTIFY_MIN_TIMEOUT), early=True
+        )
+        return {
+            'ports': len(port_codes),
+            'risk_ports': len(risk_assessments),
+            'sent': sent,
+            'seconds': round(time.perf_counter() - started, 1)
+        }
+    
+    def _analyze_all_ports(self, deadline: Optional[Deadline] = None,
+                           stale_ports: Optional[set] = None,
+                           port_codes: Optional[List[str]] = None) -> Tuple[List[RiskAssessment], int]:
+        """
+        分析所有港口的風險，並記錄各港口的風險等級（決定下次下載順序）
+        
+        Args:
+            deadline: 分析階段的時間預算，用完時停止分析其餘港口
+            stale_ports: 本次未更新（使用舊資料）的港口代碼
+            port_codes: 只分析這些港口（預設為全部港口）
+            
+        Returns:
+            Tuple[風險評估結果列表, 因時間預算用完而未分析的港口數]
+        """
+        deadline = deadline or Deadline()
+        stale_ports = stale_ports or set()
+        port_codes = port_codes if port_codes is not None else self.crawler.port_list
         risk_assessments = []
-        total_ports = len(self.crawler.port_list)
+        risk_levels = []
+        total_ports = len(port_codes)
+        seen = set()
+        unanalyzed = 0
         
         print(f"開始分析 {total_ports} 個港口...")
         
-        for i, port_code in enumerate(self.crawler.port_list, 1):
+        # 入庫時已解析的逐時預報，發布時間相符就直接使用，不必重新解析原始文字
+        parsed = self.db.get_latest_forecast_records(port_codes)
+        
+        # 一次查詢取得所有港口的最新資料，邊讀邊分析
+        snapshot = self.db.get_latest_snapshot(port_codes)
+        for i, (port_code, content, issued_time, port_name) in enumerate(snapshot, 1):
+            if deadline.expired():
+                # 只計入有資料卻來不及分析的港口（資料庫沒有資料的港口本來就不會分析）
+                unanalyzed = sum(1 for code in port_codes
+                                 if code not in seen and self.db.get_latest_time(code) is not None)
+                print(f"   ⏳ 已超過時間預算，停止分析其餘 {unanalyzed} 個港口")
+                break
+            seen.add(port_code)
             try:
-                # 從資料庫讀取最新資料
-                data = self.db.get_latest_content(port_code)
-                if not data:
-                    continue
-                
-                content, issued_time, port_name = data
-                
                 # 取得港口資訊
                 port_info = self.crawler.get_port_info(port_code)
                 if not port_info:
                     continue
                 
+                stored = parsed.get(port_code)
+                records = stored[1] if stored and stored[0] == issued_time else None
+                
                 # 分析風險
                 assessment = self.analyzer.analyze_port_risk(
-                    port_code, port_info, content, issued_time
+                    port_code, port_info, content, issued_time, records
                 )
                 
+                risk_levels.append((port_code, assessment.risk_level if assessment else 0, issued_time))
                 if assessment:
+                    assessment.stale = port_code in stale_ports
                     risk_assessments.append(assessment)
                     risk_label = self.analyzer.get_risk_label(assessment.risk_level)
-                    print(f"   [{i}/{total_ports}] ⚠️ {port_code} ({assessment.port_name}): {risk_label}")
+                    stale_note = "（舊資料）" if assessment.stale else ""
+                    print(f"   [{i}/{total_ports}] ⚠️ {port_code} ({assessment.port_name}): {risk_label}{stale_note}")
                 else:
                     print(f"   [{i}/{total_ports}] ✅ {port_code}: 安全")
                 
@@ -754,13 +922,16 @@ class WeatherMonitorService:
                 print(f"   [{i}/{total_ports}] ❌ {port_code}: 分析錯誤 - {e}")
                 continue
         
+        self.db.save_risk_levels(risk_levels)
         print(f"\n✅ 分析完成，發現 {len(risk_assessments)} 個需要關注的港口")
         
-        return risk_assessments
+        return risk_assessments, unanalyzed
     
     def _generate_report(self, download_stats: Dict[str, int],
                         risk_assessments: List[RiskAssessment],
-                        notification_sent: bool) -> Dict[str, Any]:
+                        notification_sent: bool,
+                        maintenance: Optional[Dict[str, int]] = None,
+                        budget: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """生成執行報告"""
         
         # 統計風險等級分布
@@ -791,7 +962,8 @@ class WeatherMonitorService:
                         'max_gust_time': a.max_gust_time,
                         'max_wave': a.max_wave,
                         'risk_factors': a.risk_factors,
-                        'risk_period_count': len(a.risk_periods)
+                        'risk_period_count': len(a.risk_periods),
+                        'stale': a.stale
                     }
                     for a in sorted(
                         risk_assessments,
@@ -803,14 +975,36 @@ class WeatherMonitorService:
             'notification': {
                 'sent': notification_sent,
                 'recipient': 'Microsoft Teams'
-            }
+            },
+            'maintenance': maintenance or {},
+            'budget': budget or {},
+            'api_health': self.crawler.api_health(),
+            'fetch_metrics': self.crawler.fetch_metrics.summary()
         }
         
         # 輸出報告摘要
         print("\n📋 執行報告摘要:")
         print(f"   下載成功: {download_stats['success']} 個港口")
-        print(f"   下載略過: {download_stats['skip']} 個港口")
+        print(f"   下載略過: {download_stats['skip']} 個港口（其中免請求: {download_stats.get('avoided', 0)} 個）")
+        if download_stats.get('resumed'):
+            print(f"   接續中斷的下載: {download_stats['resumed']} 個港口已在中斷前完成")
         print(f"   下載失敗: {download_stats['fail']} 個港口")
+        if 'unique_downloads' in download_stats:
+            print(f"   站點下載: {download_stats['unique_downloads']} 次（同站點分送: {download_stats['fanout_writes']} 個港口）")
+        if budget and budget.get('stale_ports'):
+            print(f"   超過時間預算: {len(budget['stale_ports'])} 個港口沿用舊資料")
+        if budget and budget.get('unanalyzed_ports'):
+            print(f"   未分析: {budget['unanalyzed_ports']} 個港口（時間預算用完）")
+        if 'hedged' in download_stats:
+            print(f"   Hedging: 備援請求 {download_stats['hedged']} 次（先回應 {download_stats['hedge_won']} 次）")
+        latency = report['fetch_metrics']['latency_ms']
+        if 'total_ms' in latency:
+            ttfb = latency.get('ttfb_ms', {})
+            print(f"   請求耗時 p50/p95/p99: {latency['total_ms']['p50']}/{latency['total_ms']['p95']}/"
+                  f"{latency['total_ms']['p99']} ms（TTFB p95 {ttfb.get('p95')} ms，"
+                  f"重試 {report['fetch_metrics']['retries']} 次）")
+        print(f"   API 狀態: 斷路器 {report['api_health']['circuit_breaker']['state']}，"
+              f"實際速率 {report['api_health']['effective_rate']} 請求/秒")
         print(f"   風險港口: {len(risk_assessments)} 個")
         print(f"     - 危險: {risk_distribution['danger']} 個")
         print(f"     - 警告: {risk_distribution['warning']} 個")
@@ -839,6 +1033,11 @@ class WeatherMonitorService:
 # ================= 主程式進入點 =================
 def main():
     """主程式"""
+    parser = argparse.ArgumentParser(description='WNI 港口氣象自動監控')
+    parser.add_argument('--resume', action='store_true',
+                        help='接續上一次中斷的下載，只下載尚未完成的港口')
+    args = parser.parse_args()
+    
     print("=" * 80)
     print("🌊 WNI 港口氣象自動監控系統")
     print("=" * 80)
@@ -855,17 +1054,21 @@ def main():
     if not TEAMS_WEBHOOK_URL:
         print("⚠️ 警告: 未設定 TEAMS_WEBHOOK_URL，將無法發送 Teams 通知")
     
+    # 時間預算從程式啟動起算（含初始化時的登入）
+    deadline = Deadline(RUN_BUDGET_SECONDS)
+    service = None
     try:
         # 初始化監控服務
         service = WeatherMonitorService(
             username=AEDYN_USERNAME,
             password=AEDYN_PASSWORD,
             teams_webhook_url=TEAMS_WEBHOOK_URL,
-            excel_path=EXCEL_FILE_PATH
+            excel_path=EXCEL_FILE_PATH,
+            deadline=deadline
         )
         
         # 執行每日監控
-        report = service.run_daily_monitoring()
+        report = service.run_daily_monitoring(deadline, resume=args.resume)
         
         # 儲存報告
         report_file = service.save_report_to_file(report)
@@ -886,6 +1089,10 @@ def main():
         print(f"\n❌ 執行過程中發生錯誤: {e}")
         traceback.print_exc()
         sys.exit(1)
+    
+    finally:
+        if service:
+            service.close()
 
 
 if __name__ == "__main__":
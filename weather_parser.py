@@ -1,7 +1,7 @@
 # weather_parser.py
 import re
 from datetime import datetime
-from typing import List, Tuple, Dict, Any
+from typing import List, Tuple, Dict, Any, Optional
 from dataclasses import dataclass
 from constant import speed_kts_to_bft, wind_dir_deg, HIGH_WIND_SPEED_kts, HIGH_WIND_SPEED_Bft, HIGH_GUST_SPEED_kts, HIGH_GUST_SPEED_Bft, HIGH_WAVE_SIG
 
@@ -16,6 +16,7 @@ class WeatherRecord:
     wave_height: float          # 顯著浪高 (meters)
     wave_max: float             # 最大浪高 (meters)
     wave_period: float          # 週期 (seconds)
+    utc_time: Optional[datetime] = None  # 預報時間 (UTC)
     
     def __post_init__(self):
         """資料驗證與轉換"""
@@ -106,13 +107,15 @@ class WeatherParser:
     
     LINE_PATTERN = re.compile(r'^\d{4}\s+\d{4}\s+\d{4}\s+\d{4}')
     WIND_BLOCK_KEY = "WIND kts"
+    WEATHER_BLOCK_KEY = "2. WEATHER"
 
-    def parse_content(self, content: str) -> Tuple[str, List[WeatherRecord], List[str]]:
+    def parse_content(self, content: str, year: Optional[int] = None) -> Tuple[str, List[WeatherRecord], List[str]]:
         """
         解析 WNI 氣象檔案內容
         
         Args:
             content: WNI 氣象檔案的文字內容
+            year: 第一筆資料的年份（預設為今年，建議傳入發布時間的年份）
             
         Returns:
             Tuple[港口名稱, 氣象記錄列表, 警告訊息列表]
@@ -138,7 +141,7 @@ class WeatherParser:
         if wind_section_start is None:
             raise ValueError("找不到 WIND 資料區段 (WIND kts)")
         
-        current_year = datetime.now().year
+        current_year = year if year is not None else datetime.now().year
         prev_mmdd = None
         
         for line in lines[wind_section_start:]:
@@ -169,6 +172,14 @@ class WeatherParser:
                 
                 dt = datetime.strptime(f"{current_year}{local_date}{local_time}", "%Y%m%d%H%M")
                 
+                # UTC 日期與當地日期可能落在不同年（12/31 與 01/01）
+                utc_year = current_year
+                if parts[0].startswith("12") and local_date.startswith("01"):
+                    utc_year -= 1
+                elif parts[0].startswith("01") and local_date.startswith("12"):
+                    utc_year += 1
+                utc_dt = datetime.strptime(f"{utc_year}{parts[0]}{parts[1]}", "%Y%m%d%H%M")
+                
                 def _safe_float(val_str):
                     """安全轉換為浮點數（處理 * 符號）"""
                     clean = val_str.replace('*', '')
@@ -183,7 +194,8 @@ class WeatherParser:
                     wave_direction=parts[7],
                     wave_height=_safe_float(parts[8]),
                     wave_max=_safe_float(parts[9]),
-                    wave_period=_safe_float(parts[10])
+                    wave_period=_safe_float(parts[10]),
+                    utc_time=utc_dt
                 )
                 records.append(record)
                 
@@ -196,6 +208,58 @@ class WeatherParser:
         
         return port_name, records, warnings
     
+    def parse_weather_section(self, content: str) -> Dict[str, Dict[str, Any]]:
+        """
+        解析「2. WEATHER」區段（氣溫、降水、氣壓、能見度、天氣、沙塵暴）
+        
+        Args:
+            content: WNI 氣象檔案的文字內容
+            
+        Returns:
+            Dict[UTC 時間 "MMDD HHMM", 天氣欄位字典]，找不到區段時回傳空字典
+        """
+        lines = content.strip().split('\n')
+        
+        section_start = None
+        for i, line in enumerate(lines):
+            if line.strip().upper().startswith(self.WEATHER_BLOCK_KEY):
+                section_start = i + 1
+                break
+        
+        if section_start is None:
+            return {}
+        
+        def _safe_float(val_str):
+            """安全轉換為浮點數（無法轉換時為 None）"""
+            try:
+                return float(val_str.replace('*', ''))
+            except ValueError:
+                return None
+        
+        weather = {}
+        for line in lines[section_start:]:
+            line = line.strip()
+            
+            if not self.LINE_PATTERN.match(line):
+                if weather and not line:
+                    break
+                continue
+            
+            parts = line.split()
+            if len(parts) < 9:
+                continue
+            
+            weather[f"{parts[0]} {parts[1]}"] = {
+                'temp_c': _safe_float(parts[4]),
+                'precip_mmh': _safe_float(parts[5]),
+                'pressure_hpa': _safe_float(parts[6]),
+                'visibility': parts[7],
+                'weather': parts[8],
+                'sds': parts[9] if len(parts) > 9 else None,
+            }
+        
+        return weather
+
     def parse_file(self, file_path: str) -> Tuple[str, List[WeatherRecord], List[str]]:
         """
         從檔案解析氣象資料
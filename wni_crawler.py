@@ -1,23 +1,39 @@
 # wni_crawler.py
 import requests
 import sqlite3
-import pandas as pd
 import os
+import math
 import json
 import pickle
-from datetime import datetime, timedelta
-from typing import Optional, Dict, Tuple, List, Any
+import queue
+import atexit
+import zlib
+import hashlib
+import re
+import html
+import base64
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, Tuple, List, Any, Iterable, Iterator, Callable, Union
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 import urllib3
-import numpy as np
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException
+import urllib3.connection
+from weather_parser import WeatherParser, WeatherRecord
 import time
+import threading
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, Future, as_completed, wait, FIRST_COMPLETED
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from urllib.parse import urlparse, urljoin, parse_qsl
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# selenium 與 pandas 載入成本高，只在實際登入 / 讀取 Excel 時才匯入（見 benchmark_startup.py）
 
 # 忽略 SSL 警告
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -28,9 +44,63 @@ EXCEL_FILE_WANHAI = 'WHL_all_ports_list.xlsx'
 COOKIE_FILE = 'aedyn_cookies.pkl'
 TIMEOUT = 30
 MAX_RETRIES = 3
-COOKIE_EXPIRY_HOURS = 24
+COOKIE_EXPIRY_HOURS = 24       # JWT 沒有 exp 時，依 Cookie 檔案時間判斷過期
+TOKEN_REFRESH_MARGIN_MINUTES = 10  # JWT 到期前多久主動重新登入
+TOKEN_REFRESH_RETRY_SECONDS = 60   # 背景更新失敗後多久重試
+CREDENTIAL_LOCK_TIMEOUT = 300      # 等待其他行程登入（Cookie 檔案鎖）的秒數上限
+MAX_WORKERS = 8        # 批次下載的同時工作執行緒數
+MAX_PER_HOST = 4       # 每個主機同時進行中的請求上限
+ASYNC_CONCURRENCY = 64 # asyncio 爬蟲同時進行中的下載數上限
+RETRY_STATUS = [429, 500, 502, 503, 504]  # 由爬蟲自行重試並回饋給限速器（urllib3 只重試連線錯誤）
+RATE_LIMIT_INITIAL = 20.0      # 限速器起始速率（請求/秒）
+RATE_LIMIT_MIN = 0.5           # 限速器速率下限
+RATE_LIMIT_MAX = 100.0         # 限速器速率上限
+RATE_LIMIT_INCREASE = 1.0      # 每次成功增加的速率（加法增加）
+RATE_LIMIT_SLOW_START = 1.1    # 第一次被節流前，每次成功速率乘上的倍數（快速爬升到 API 允許的速率）
+RATE_LIMIT_DECREASE = 0.5      # 遇到 429/5xx 時速率乘上的倍數（乘法減少）
+BREAKER_FAILURE_THRESHOLD = 5  # 連續幾次 5xx / 連線失敗就開啟斷路器
+BREAKER_COOLDOWN_SECONDS = 30  # 斷路器開啟後多久放行一個試探請求
+BREAKER_MAX_FAILED_PROBES = 3  # 試探連續失敗幾次後不再等待冷卻（其餘港口直接略過，直到試探成功）
+BREAKER_PROBE_POLL_SECONDS = 0.5  # 試探請求進行中時，其他請求多久確認一次結果
+BREAKER_OPEN_MESSAGE = "API 暫停中（斷路器開啟），略過下載"
+HEDGE_PERCENTILE = 0.95        # hedging：等待超過本次批次回應時間的此百分位數就再送一份請求
+HEDGE_MIN_SAMPLES = 10         # hedging：至少累積幾筆回應時間才開始啟用
+HEDGE_MIN_DELAY = 0.5          # hedging：等待門檻下限（秒），避免對正常回應也重送
+STALE_MESSAGE = "已超過執行時間預算，沿用資料庫中的舊資料"
+STREAM_CHUNK_SIZE = 1024       # 串流下載每次讀取的位元組數
+STREAM_HEADER_BYTES = 4096     # 在前幾個位元組內找 ISSUED AT，找不到就直接讀完全文
+STREAM_DRAIN_MAX_BYTES = 16 * 1024  # 中止下載時剩餘內容不超過此大小就讀完，保留 keep-alive 連線（重新連線比較貴）
+FETCH_METRICS_SLOWEST = 10     # 執行報告中列出最慢的幾個站點
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",      # 讀寫不互相阻塞，多個行程可同時讀取
+    "PRAGMA synchronous=NORMAL",    # WAL 模式下仍保證一致性，減少 fsync
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-8000",      # 約 8 MB 頁面快取
+    "PRAGMA busy_timeout=5000",     # 其他行程寫入中時等待而非立即失敗
+)
+WRITE_BATCH_SIZE = 50          # 批次寫入：累積幾筆就寫入一次
+WRITE_FLUSH_SECONDS = 2.0      # 批次寫入：最久等待幾秒就寫入一次
+RETENTION_FULL_DAYS = 7        # 保留所有發布的天數
+RETENTION_DAILY_DAYS = 90      # 超過 RETENTION_FULL_DAYS 後每天只保留最後一次發布，超過此天數全部刪除
+PORT_REGISTRY_CACHE_SUFFIX = '.ports.json'  # 編譯後港口清單快取（與 Excel 同目錄）
+PORT_REGISTRY_CACHE_STAMP_SUFFIX = '.stamp'  # 快取旁記錄 Excel 修改時間的檔案（不納入版控，只用來略過雜湊計算）
+PORT_REGISTRY_CACHE_VERSION = 2
+CONTENT_COMPRESS_LEVEL = 9     # 氣象內容的 zlib 壓縮等級
+SNAPSHOT_FETCH_SIZE = 500      # 最新資料快照每次從 cursor 取出的筆數
+ISSUANCE_HISTORY_SIZE = 8       # 推估發布週期時參考的最近發布次數
+CRAWL_RESUME_WINDOW_MINUTES = 120  # 接續中斷的批次下載時，多久內完成的港口不必重新下載
+MIN_ISSUANCE_CADENCE_HOURS = 1  # 發布週期推估值的下限
+MAX_ISSUANCE_CADENCE_HOURS = 24 # 發布週期推估值的上限
+MIN_ISSUANCE_INTERVALS = 3      # 至少要有幾個發布間隔才推估週期
+MIN_CADENCE_OBSERVATIONS = 2    # 推估的週期至少要實際出現幾次才採信（否則不略過該港口）
 
-LOGIN_URL = (
+LOGIN_BACKEND = os.getenv('AEDYN_LOGIN_BACKEND', 'auto')  # auto: 先以 HTTP 登入，失敗再改用 Selenium；http / selenium: 只用指定方式
+LOGIN_MAX_REDIRECTS = 10       # HTTP 登入時最多跟隨的轉址次數
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+# 可用環境變數改指向本機模擬伺服器（見 mock_aedyn_server.py）
+AEDYN_BASE_URL = os.getenv('AEDYN_BASE_URL', 'https://aedyn.weathernews.com').rstrip('/')
+LOGIN_URL = os.getenv('AEDYN_LOGIN_URL') or (
     "https://idp.aedyn.wni.com/auth/realms/aedyn/protocol/openid-connect/auth"
     "?response_type=id_token%20token&scope=openid&client_id=aedyn"
     "&state=cZr_CP7VqEq2p8j6D_a_YrL2ucA"
@@ -39,10 +109,29 @@ LOGIN_URL = (
 )
 
 
+def _try_lock_file(f) -> None:
+    """以非阻塞方式取得檔案的獨占鎖，失敗時拋出 OSError"""
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+
+
+def _unlock_file(f) -> None:
+    """釋放 _try_lock_file 取得的鎖"""
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
 class AedynLoginManager:
     """負責自動登入 Aedyn 並取得最新 Cookie 和 JWT Token"""
     
-    def __init__(self, username: str, password: str, cookie_file: str = COOKIE_FILE):
+    def __init__(self, username: str, password: str, cookie_file: str = COOKIE_FILE,
+                 backend: str = LOGIN_BACKEND, base_url: str = AEDYN_BASE_URL, login_url: str = LOGIN_URL):
         """
         初始化登入管理器
         
@@ -50,27 +139,151 @@ class AedynLoginManager:
             username: Aedyn 帳號
             password: Aedyn 密碼
             cookie_file: Cookie 儲存檔案路徑
+            backend: 登入方式（auto / http / selenium）
+            base_url: Aedyn 網站根網址
+            login_url: Keycloak 登入網址
         """
         self.username = username
         self.password = password
         self.cookie_file = cookie_file
+        self.backend = backend
+        self.base_url = base_url.rstrip('/')
+        self.login_url = login_url
         self.cookies: Dict[str, str] = {}
         self.jwt_token: str = ""
         self.cookie_timestamp: Optional[datetime] = None
+
+    @staticmethod
+    def decode_jwt_expiry(token: str) -> Optional[datetime]:
+        """
+        解析 JWT payload 的 exp（不驗證簽章，只用來判斷何時需要更新）
+        
+        Args:
+            token: JWT 字串
+            
+        Returns:
+            datetime: 到期時間（本地時間），無法解析返回 None
+        """
+        try:
+            payload = token.split('.')[1]
+            claims = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+            return datetime.fromtimestamp(float(claims['exp']))
+        except Exception:
+            return None
+
+    @property
+    def token_expiry(self) -> Optional[datetime]:
+        """目前 JWT 的到期時間，沒有 JWT 或無 exp 時為 None"""
+        return self.decode_jwt_expiry(self.jwt_token) if self.jwt_token else None
+
+    def seconds_until_expiry(self) -> Optional[float]:
+        """
+        距離 JWT 到期的秒數
+        
+        Returns:
+            float: 剩餘秒數（已過期為負數），無法得知返回 None
+        """
+        expiry = self.token_expiry
+        if expiry is None:
+            return None
+        return (expiry - datetime.now()).total_seconds()
+
+    def is_token_fresh(self, margin_seconds: float = TOKEN_REFRESH_MARGIN_MINUTES * 60) -> bool:
+        """
+        JWT 是否還有足夠的有效時間（可略過線上驗證）
+        
+        Args:
+            margin_seconds: 至少需剩餘的秒數
+            
+        Returns:
+            bool: 剩餘時間大於 margin_seconds 返回 True；無法得知到期時間返回 False
+        """
+        remaining = self.seconds_until_expiry()
+        return remaining is not None and remaining > margin_seconds
         
+    @contextmanager
+    def _credential_lock(self, timeout: float = CREDENTIAL_LOCK_TIMEOUT) -> Iterator[None]:
+        """
+        跨行程的 Cookie 檔案鎖：同一時間只有一個行程能登入並寫入 Cookie
+        
+        Args:
+            timeout: 等待鎖的秒數上限
+        """
+        lock_path = f"{self.cookie_file}.lock"
+        with open(lock_path, 'a+b') as f:
+            deadline = time.monotonic() + timeout
+            waiting = False
+            while True:
+                try:
+                    _try_lock_file(f)
+                    break
+                except OSError:
+                    if time.monotonic() >= deadline:
+                        raise TimeoutError(f"等待 Cookie 檔案鎖逾時（{timeout:.1f} 秒）: {lock_path}")
+                    if not waiting:
+                        print("⏳ 其他程序正在登入，等待其完成...")
+                        waiting = True
+                    time.sleep(0.2)
+            try:
+                yield
+            finally:
+                _unlock_file(f)
+
     def save_cookies(self) -> None:
-        """儲存 Cookie 到檔案"""
+        """儲存 Cookie 到檔案（先寫暫存檔再置換，其他行程不會讀到寫到一半的檔案）"""
         try:
+            if self.cookie_timestamp is None:
+                self.cookie_timestamp = datetime.now()
             data = {
                 'cookies': self.cookies,
                 'jwt_token': self.jwt_token,
-                'timestamp': datetime.now()
+                'timestamp': self.cookie_timestamp
             }
-            with open(self.cookie_file, 'wb') as f:
+            tmp_path = f"{self.cookie_file}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
                 pickle.dump(data, f)
+            os.replace(tmp_path, self.cookie_file)
             print(f"✅ Cookie 已儲存至 {self.cookie_file}")
         except Exception as e:
             print(f"⚠️ Cookie 儲存失敗: {e}")
+
+    def _read_credentials(self) -> Optional[Dict[str, Any]]:
+        """
+        讀取 Cookie 檔案內容
+        
+        Returns:
+            dict: {'cookies', 'jwt_token', 'timestamp'}，檔案不存在返回 None
+        """
+        if not os.path.exists(self.cookie_file):
+            return None
+        with open(self.cookie_file, 'rb') as f:
+            return pickle.load(f)
+
+    def _adopt_shared_credentials(self) -> bool:
+        """
+        其他行程在我們上次載入後已更新 Cookie 檔案，且新的 Token 可用時直接沿用（需在檔案鎖內呼叫）
+        
+        Returns:
+            bool: 已沿用其他行程的 Cookie 返回 True
+        """
+        try:
+            data = self._read_credentials()
+        except Exception:
+            return False
+        timestamp = data.get('timestamp') if data else None
+        if timestamp is None or (self.cookie_timestamp is not None and timestamp <= self.cookie_timestamp):
+            return False
+        
+        previous = (self.cookies, self.jwt_token, self.cookie_timestamp)
+        self.cookies = data.get('cookies', {})
+        self.jwt_token = data.get('jwt_token', '')
+        self.cookie_timestamp = timestamp
+        if self.is_token_fresh() or (self.token_expiry is None and self.verify_cookies()):
+            print(f"✅ 沿用其他程序於 {timestamp.strftime('%Y-%m-%d %H:%M:%S')} 更新的 Cookie，略過登入")
+            return True
+        
+        self.cookies, self.jwt_token, self.cookie_timestamp = previous
+        return False
     
     def load_cookies(self) -> bool:
         """
@@ -79,18 +292,25 @@ class AedynLoginManager:
         Returns:
             bool: 載入成功且未過期返回 True
         """
-        if not os.path.exists(self.cookie_file):
-            print(f"ℹ️ Cookie 檔案不存在: {self.cookie_file}")
-            return False
-        
         try:
-            with open(self.cookie_file, 'rb') as f:
-                data = pickle.load(f)
+            data = self._read_credentials()
+            if data is None:
+                print(f"ℹ️ Cookie 檔案不存在: {self.cookie_file}")
+                return False
             
             self.cookies = data.get('cookies', {})
             self.jwt_token = data.get('jwt_token', '')
             self.cookie_timestamp = data.get('timestamp')
             
+            # 有 JWT exp 時以其為準
+            expiry = self.token_expiry
+            if expiry is not None:
+                if expiry <= datetime.now():
+                    print(f"⚠️ JWT Token 已於 {expiry.strftime('%Y-%m-%d %H:%M:%S')} 過期")
+                    return False
+                print(f"✅ 已載入 Cookie (數量: {len(self.cookies)})，JWT 有效至 {expiry.strftime('%Y-%m-%d %H:%M:%S')}")
+                return True
+            
             # 檢查 Cookie 是否過期
             if self.cookie_timestamp:
                 age = datetime.now() - self.cookie_timestamp
@@ -107,10 +327,13 @@ class AedynLoginManager:
             print(f"⚠️ Cookie 載入失敗: {e}")
             return False
     
-    def verify_cookies(self) -> bool:
+    def verify_cookies(self, timeout: float = 10) -> bool:
         """
         驗證 Cookie 是否有效
         
+        Args:
+            timeout: 請求逾時秒數
+            
         Returns:
             bool: Cookie 有效返回 True
         """
@@ -120,9 +343,9 @@ class AedynLoginManager:
         try:
             headers = self.get_headers()
             response = requests.get(
-                "https://aedyn.weathernews.com/api/account/user",
+                f"{self.base_url}/api/account/user",
                 headers=headers,
-                timeout=10,
+                timeout=timeout,
                 verify=False
             )
             
@@ -139,16 +362,191 @@ class AedynLoginManager:
             print(f"❌ Cookie 驗證失敗: {e}")
             return False
         
-    def login_and_get_cookies(self, headless: bool = True) -> Dict[str, Any]:
+    def login(self, headless: bool = True, timeout: float = TIMEOUT,
+              lock_timeout: float = CREDENTIAL_LOCK_TIMEOUT) -> Dict[str, Any]:
+        """
+        依 backend 設定登入：auto 先以 HTTP 登入，失敗才改用 Selenium
+        
+        登入期間持有跨行程檔案鎖；等到鎖時若其他行程已完成登入，直接沿用其 Cookie
+        
+        Args:
+            headless: Selenium 是否使用無頭模式
+            timeout: 每個等待步驟（HTTP 請求 / 頁面載入）的逾時秒數
+            lock_timeout: 等待其他行程登入（Cookie 檔案鎖）的秒數上限
+            
+        Returns:
+            dict: 包含 cookies 和 jwt_token 的字典
+        """
+        with self._credential_lock(lock_timeout):
+            if self._adopt_shared_credentials():
+                return {
+                    'cookies': self.cookies,
+                    'jwt_token': self.jwt_token
+                }
+            
+            if self.backend in ('auto', 'http'):
+                try:
+                    # auto 模式下沒拿到 JWT 也算失敗，改由瀏覽器從 localStorage 取得
+                    return self.login_via_http(timeout=timeout, require_jwt=self.backend == 'auto')
+                except Exception as e:
+                    if self.backend == 'http':
+                        raise
+                    print(f"⚠️ HTTP 登入失敗，改用瀏覽器登入: {e}")
+            return self.login_and_get_cookies(headless=headless, timeout=timeout)
+
+    def login_via_http(self, timeout: float = TIMEOUT, require_jwt: bool = False) -> Dict[str, Any]:
+        """
+        不開瀏覽器，直接以 HTTP 完成 Keycloak 登入
+        
+        流程：取得登入頁 → 送出帳密表單 → 跟隨轉址 → 開啟首頁建立 Aedyn session → 呼叫 user API 驗證
+        
+        JWT 只能從 jwt Cookie 取得；前端 SPA 存在 localStorage 的 JWT 必須用瀏覽器登入才拿得到。
+        
+        Args:
+            timeout: 每個 HTTP 請求的逾時秒數
+            require_jwt: 沒有取得 JWT 時是否視為登入失敗（拋出例外，不儲存 Cookie）
+            
+        Returns:
+            dict: 包含 cookies 和 jwt_token 的字典
+        """
+        print("🔐 正在以 HTTP 登入 Aedyn...")
+        with requests.Session() as session:
+            session.headers.update({
+                "User-Agent": USER_AGENT,
+                "Accept-Language": "zh-TW,zh-CN;q=0.9,zh;q=0.8,en-US;q=0.7,en;q=0.6"
+            })
+            session.verify = False
+            
+            # 1. 登入頁（若 Keycloak 已有 SSO session 會直接轉址回來）
+            response = self._follow_login_redirects(
+                session, session.get(self.login_url, allow_redirects=False, timeout=timeout), timeout
+            )
+            action = self._find_login_form_action(response.text)
+            if not action:
+                raise Exception(f"找不到登入表單 (HTTP {response.status_code}, {response.url})")
+            
+            # 2. 送出帳密；成功時 Keycloak 以 302 轉址，失敗則回到登入頁
+            response = session.post(
+                urljoin(response.url, action),
+                data={'username': self.username, 'password': self.password, 'credentialId': ''},
+                allow_redirects=False,
+                timeout=timeout
+            )
+            if not response.is_redirect:
+                raise Exception(f"帳號或密碼錯誤 (HTTP {response.status_code})")
+            self._follow_login_redirects(session, response, timeout)
+            
+            # 3. 開啟首頁，Aedyn 會沿用 Keycloak 的 SSO session 重新授權並建立自己的 session
+            self._follow_login_redirects(
+                session, session.get(f"{self.base_url}/", allow_redirects=False, timeout=timeout), timeout
+            )
+            
+            # 4. 呼叫 user API 驗證，並收集 Aedyn 網域下的 Cookie
+            response = session.get(
+                f"{self.base_url}/api/account/user",
+                headers={"Accept": "application/json, text/plain, */*", "Referer": f"{self.base_url}/"},
+                timeout=timeout
+            )
+            host = urlparse(self.base_url).hostname or ''
+            cookie_dict = {}
+            for cookie in session.cookies:
+                domain = cookie.domain.lstrip('.')
+                if host == domain or host.endswith('.' + domain):
+                    cookie_dict[cookie.name] = cookie.value
+        
+        if response.status_code != 200:
+            raise Exception(f"登入後仍無法存取 Aedyn (HTTP {response.status_code})")
+        
+        user_name = response.json().get('user_disp_name', 'Unknown User')
+        print(f"✅ HTTP 登入成功！使用者: {user_name}")
+        
+        jwt_token = cookie_dict.get('jwt', '')
+        if not jwt_token:
+            if require_jwt:
+                raise Exception("HTTP 登入未取得 JWT Token（jwt Cookie 不存在）")
+            print("⚠️ HTTP 登入未取得 JWT Token，API 請求將不帶 json_web_token")
+        else:
+            print(f"✅ 已取得 JWT Token (長度: {len(jwt_token)})")
+        
+        self.jwt_token = jwt_token
+        self.cookies = cookie_dict
+        self.cookie_timestamp = datetime.now()
+        self.save_cookies()
+        
+        return {
+            'cookies': cookie_dict,
+            'jwt_token': self.jwt_token
+        }
+
+    def _follow_login_redirects(self, session: requests.Session, response: requests.Response,
+                                timeout: float = TIMEOUT) -> requests.Response:
+        """
+        手動跟隨 OIDC 轉址鏈
+        
+        implicit flow 的 token 放在網址 fragment（#id_token=...），瀏覽器是由 redirect_uri 頁面的
+        JavaScript 以表單 POST 回傳給伺服器，這裡直接代為送出。
+        
+        Args:
+            session: 登入用的 requests session
+            response: 轉址鏈的第一個回應
+            timeout: 每個 HTTP 請求的逾時秒數
+            
+        Returns:
+            requests.Response: 轉址鏈最後一個（非轉址）回應
+        """
+        for _ in range(LOGIN_MAX_REDIRECTS):
+            if not response.is_redirect:
+                return response
+            
+            url, _, fragment = urljoin(response.url, response.headers['Location']).partition('#')
+            params = dict(parse_qsl(fragment))
+            if 'error' in params:
+                raise Exception(f"授權失敗: {params.get('error_description', params['error'])}")
+            
+            if 'id_token' in params or 'access_token' in params:
+                params['response_mode'] = 'fragment'
+                response = session.post(url, data=params, allow_redirects=False, timeout=timeout)
+            else:
+                response = session.get(url, allow_redirects=False, timeout=timeout)
+        
+        raise Exception(f"登入轉址超過 {LOGIN_MAX_REDIRECTS} 次")
+
+    @staticmethod
+    def _find_login_form_action(page: str) -> Optional[str]:
+        """
+        從 Keycloak 登入頁取出帳密表單的 action 網址
+        
+        Args:
+            page: 登入頁 HTML
+            
+        Returns:
+            str: 表單 action（已還原 HTML 實體），找不到返回 None
+        """
+        for match in re.finditer(r'<form\b[^>]*>', page, re.IGNORECASE):
+            tag = match.group(0)
+            action = re.search(r'\baction\s*=\s*["\']([^"\']+)["\']', tag, re.IGNORECASE)
+            if action and ('kc-form-login' in tag or 'login-actions' in action.group(1)):
+                return html.unescape(action.group(1))
+        return None
+
+    def login_and_get_cookies(self, headless: bool = True, timeout: float = TIMEOUT) -> Dict[str, Any]:
         """
         使用 Selenium 登入 Aedyn 並取得 Cookie 和 JWT Token
         
         Args:
             headless: 是否使用無頭模式（預設 True）
+            timeout: 等待頁面元素與跳轉的秒數上限
             
         Returns:
             dict: 包含 cookies 和 jwt_token 的字典
         """
+        from selenium import webdriver
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.common.keys import Keys
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.common.exceptions import TimeoutException
+        
         options = webdriver.ChromeOptions()
         options.add_argument("--start-maximized")
         options.add_argument("--disable-blink-features=AutomationControlled")
@@ -159,13 +557,14 @@ class AedynLoginManager:
         if headless:
             options.add_argument("--headless=new")
 
+        host = urlparse(self.base_url).netloc
         driver = None
         try:
             driver = webdriver.Chrome(options=options)
-            wait = WebDriverWait(driver, 30)
+            wait = WebDriverWait(driver, timeout)
 
             print("🔐 正在嘗試登入 Aedyn...")
-            driver.get(LOGIN_URL)
+            driver.get(self.login_url)
 
             # 等待登入頁面載入
             try:
@@ -183,13 +582,13 @@ class AedynLoginManager:
                 pwd_el.send_keys(Keys.ENTER)
 
                 # 等待跳轉到主頁面
-                wait.until(lambda d: "aedyn.weathernews.com" in d.current_url and "redirect_uri" not in d.current_url)
+                wait.until(lambda d: host in d.current_url and "redirect_uri" not in d.current_url)
                 
                 print("✅ 登入成功，正在取得 Cookie...")
                 
             except TimeoutException:
                 # 可能已經登入過了，直接檢查是否在正確頁面
-                if "aedyn.weathernews.com" in driver.current_url:
+                if host in driver.current_url:
                     print("✅ 檢測到已登入狀態")
                 else:
                     raise Exception("登入流程超時")
@@ -207,11 +606,11 @@ class AedynLoginManager:
             print("🔍 正在取得 JWT Token...")
             
             # 先訪問主頁確保 session 建立
-            driver.get("https://aedyn.weathernews.com/")
+            driver.get(f"{self.base_url}/")
             time.sleep(2)
             
             # 訪問 user API 來取得 JWT
-            driver.get("https://aedyn.weathernews.com/api/account/user")
+            driver.get(f"{self.base_url}/api/account/user")
             time.sleep(2)
             
             # 再次取得 Cookie（可能有更新）
@@ -242,7 +641,7 @@ class AedynLoginManager:
                     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
                     "Cookie": cookie_string,
                     "Accept": "application/json, text/plain, */*",
-                    "Referer": "https://aedyn.weathernews.com/"
+                    "Referer": f"{self.base_url}/"
                 }
                 
                 if self.jwt_token:
@@ -250,9 +649,9 @@ class AedynLoginManager:
                 
                 try:
                     response = requests.get(
-                        "https://aedyn.weathernews.com/api/account/user",
+                        f"{self.base_url}/api/account/user",
                         headers=headers,
-                        timeout=10,
+                        timeout=min(10, timeout),
                         verify=False
                     )
                     
@@ -309,10 +708,10 @@ class AedynLoginManager:
             dict: HTTP Headers
         """
         headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+            "User-Agent": USER_AGENT,
             "Accept": "application/json, text/plain, */*",
             "Accept-Language": "zh-TW,zh-CN;q=0.9,zh;q=0.8,en-US;q=0.7,en;q=0.6",
-            "Referer": "https://aedyn.weathernews.com/",
+            "Referer": f"{self.base_url}/",
             "sec-ch-ua": "\"Google Chrome\";v=\"120\", \"Chromium\";v=\"120\", \"Not_A Brand\";v=\"24\"",
             "sec-ch-ua-mobile": "?0",
             "sec-ch-ua-platform": "\"Windows\"",
@@ -331,7 +730,7 @@ class AedynLoginManager:
 
 
 class WeatherDatabase:
-    """氣象資料庫管理類別"""
+    """氣象資料庫管理類別（共用一條長連線，可跨執行緒使用）"""
     
     def __init__(self, db_file: str = DB_FILE):
         """
@@ -341,12 +740,62 @@ class WeatherDatabase:
             db_file: 資料庫檔案路徑
         """
         self.db_file = db_file
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.RLock()
         self.init_database()
 
+    def __enter__(self) -> "WeatherDatabase":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        取得（必要時建立）長連線並套用效能相關的 PRAGMA
+        
+        Returns:
+            sqlite3.Connection: 資料庫連線
+        """
+        if self._conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=30, check_same_thread=False, cached_statements=256)
+            for pragma in SQLITE_PRAGMAS:
+                conn.execute(pragma)
+            self._conn = conn
+        return self._conn
+
+    @contextmanager
+    def _cursor(self, commit: bool = False):
+        """
+        在鎖保護下取得 cursor，多個執行緒共用同一條連線時不會互相干擾
+        
+        Args:
+            commit: 區塊結束時是否提交（發生例外則回滾）
+        """
+        with self._lock:
+            conn = self._connection()
+            cursor = conn.cursor()
+            try:
+                yield cursor
+                if commit:
+                    conn.commit()
+            except Exception:
+                if commit:
+                    conn.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def close(self) -> None:
+        """關閉資料庫連線（之後再呼叫任何方法會自動重新連線）"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
     def init_database(self) -> None:
         """建立資料庫表格"""
-        with sqlite3.connect(self.db_file) as conn:
-            cursor = conn.cursor()
+        with self._cursor(commit=True) as cursor:
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS weather_data (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -358,10 +807,141 @@ class WeatherDatabase:
                     issued_time TEXT NOT NULL,
                     content TEXT NOT NULL,
                     download_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    content_hash TEXT,
                     UNIQUE(whl_port_code, issued_time)
                 )
             ''')
-            conn.commit()
+            # 舊版資料庫沒有 content_hash 欄位
+            columns = [row[1] for row in cursor.execute('PRAGMA table_info(weather_data)')]
+            if 'content_hash' not in columns:
+                cursor.execute('ALTER TABLE weather_data ADD COLUMN content_hash TEXT')
+            # 壓縮後的氣象內容，以內容雜湊去重（不同港口或重複下載的相同內容只存一份）
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS bulletin_blobs (
+                    content_hash TEXT PRIMARY KEY,
+                    content BLOB NOT NULL
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS forecast_records (
+                    whl_port_code TEXT NOT NULL,
+                    issued_time TEXT NOT NULL,
+                    valid_time TEXT NOT NULL,
+                    local_time TEXT NOT NULL,
+                    wind_dir TEXT,
+                    wind_speed_kts REAL,
+                    wind_gust_kts REAL,
+                    wave_dir TEXT,
+                    wave_sig_m REAL,
+                    wave_max_m REAL,
+                    wave_period_s REAL,
+                    temp_c REAL,
+                    precip_mmh REAL,
+                    pressure_hpa REAL,
+                    visibility TEXT,
+                    weather TEXT,
+                    sds TEXT,
+                    PRIMARY KEY (whl_port_code, issued_time, valid_time)
+                ) WITHOUT ROWID
+            ''')
+            cursor.execute(
+                'CREATE INDEX IF NOT EXISTS idx_forecast_valid_time ON forecast_records (valid_time, whl_port_code)'
+            )
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS http_validators (
+                    station_id TEXT PRIMARY KEY,
+                    etag TEXT,
+                    last_modified TEXT,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            # 批次下載日誌：中斷後可接續，只下載尚未完成的港口
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS crawl_runs (
+                    run_id TEXT PRIMARY KEY,
+                    started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    finished_at TIMESTAMP
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS crawl_journal (
+                    run_id TEXT NOT NULL,
+                    whl_port_code TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    issued_time TEXT,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (run_id, whl_port_code)
+                ) WITHOUT ROWID
+            ''')
+            # 各港口最近一次的風險評估，決定下次下載的優先順序
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS port_risk_levels (
+                    whl_port_code TEXT PRIMARY KEY,
+                    risk_level INTEGER NOT NULL,
+                    issued_time TEXT,
+                    assessed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+        
+        self.migrate_legacy_content()
+
+    @staticmethod
+    def _pack_content(content: str) -> Tuple[str, bytes]:
+        """
+        計算氣象內容的雜湊並壓縮
+        
+        Args:
+            content: 氣象內容
+            
+        Returns:
+            Tuple[content_hash, 壓縮後內容]
+        """
+        raw = content.encode('utf-8')
+        return hashlib.sha256(raw).hexdigest(), zlib.compress(raw, CONTENT_COMPRESS_LEVEL)
+
+    @staticmethod
+    def _unpack_content(content: str, blob: Optional[bytes]) -> str:
+        """
+        還原氣象內容（新資料存在 bulletin_blobs，舊資料仍是 weather_data.content 明文）
+        
+        Args:
+            content: weather_data.content 欄位
+            blob: bulletin_blobs.content 欄位
+            
+        Returns:
+            str: 氣象內容
+        """
+        if blob is None:
+            return content
+        return zlib.decompress(blob).decode('utf-8')
+
+    def migrate_legacy_content(self) -> int:
+        """
+        將尚未壓縮的舊資料搬到 bulletin_blobs
+        
+        Returns:
+            int: 搬移的筆數
+        """
+        with self._cursor(commit=True) as cursor:
+            cursor.execute('SELECT id, content FROM weather_data WHERE content_hash IS NULL')
+            legacy = cursor.fetchall()
+            if not legacy:
+                return 0
+            
+            blobs = {}
+            updates = []
+            for row_id, content in legacy:
+                content_hash, blob = self._pack_content(content)
+                blobs[content_hash] = blob
+                updates.append((content_hash, row_id))
+            
+            cursor.executemany(
+                'INSERT OR IGNORE INTO bulletin_blobs (content_hash, content) VALUES (?, ?)', blobs.items()
+            )
+            cursor.executemany("UPDATE weather_data SET content = '', content_hash = ? WHERE id = ?", updates)
+        
+        print(f"✅ 已將 {len(updates)} 筆氣象內容改為壓縮儲存")
+        return len(updates)
 
     def get_latest_content(self, whl_port_code: str) -> Optional[Tuple[str, str, str]]:
         """
@@ -373,15 +953,103 @@ class WeatherDatabase:
         Returns:
             Tuple[content, issued_time, port_name] 或 None
         """
-        with sqlite3.connect(self.db_file) as conn:
-            cursor = conn.cursor()
+        with self._cursor() as cursor:
             cursor.execute('''
-                SELECT content, issued_time, port_name FROM weather_data 
-                WHERE whl_port_code = ? 
-                ORDER BY issued_time DESC 
+                SELECT w.content, b.content, w.issued_time, w.port_name FROM weather_data w
+                LEFT JOIN bulletin_blobs b ON b.content_hash = w.content_hash
+                WHERE w.whl_port_code = ? 
+                ORDER BY w.issued_time DESC 
                 LIMIT 1
             ''', (whl_port_code,))
-            return cursor.fetchone()
+            row = cursor.fetchone()
+        
+        if not row:
+            return None
+        content, blob, issued_time, port_name = row
+        return self._unpack_content(content, blob), issued_time, port_name
+
+    def get_latest_snapshot(self, port_codes: Optional[Iterable[str]] = None) -> Iterator[Tuple[str, str, str, str]]:
+        """
+        以單一查詢取得各港口最新的氣象內容，逐批串流回傳
+        
+        Args:
+            port_codes: 只回傳這些港口（預設全部）
+            
+        Yields:
+            Tuple[whl_port_code, content, issued_time, port_name]
+        """
+        wanted = set(port_codes) if port_codes is not None else None
+        
+        with self._lock:
+            cursor = self._connection().cursor()
+            cursor.execute('''
+                SELECT w.whl_port_code, w.content, b.content, w.issued_time, w.port_name FROM (
+                    SELECT whl_port_code, content, content_hash, issued_time, port_name,
+                           ROW_NUMBER() OVER (PARTITION BY whl_port_code ORDER BY issued_time DESC) AS rn
+                    FROM weather_data
+                ) w
+                LEFT JOIN bulletin_blobs b ON b.content_hash = w.content_hash
+                WHERE w.rn = 1
+            ''')
+        try:
+            while True:
+                # 只在取資料時持有鎖，呼叫端處理資料時不阻擋其他執行緒
+                with self._lock:
+                    rows = cursor.fetchmany(SNAPSHOT_FETCH_SIZE)
+                if not rows:
+                    break
+                for whl_port_code, content, blob, issued_time, port_name in rows:
+                    if wanted is None or whl_port_code in wanted:
+                        yield whl_port_code, self._unpack_content(content, blob), issued_time, port_name
+        finally:
+            with self._lock:
+                cursor.close()
+
+    def get_latest_forecast_records(self, port_codes: Optional[Iterable[str]] = None
+                                    ) -> Dict[str, Tuple[str, List[WeatherRecord]]]:
+        """
+        以單一查詢取得各港口最新一次發布的已解析逐時預報
+        
+        Args:
+            port_codes: 只回傳這些港口（預設全部）
+            
+        Returns:
+            Dict[港口代碼, Tuple[issued_time, 氣象記錄列表]]
+        """
+        wanted = set(port_codes) if port_codes is not None else None
+        forecasts: Dict[str, Tuple[str, List[WeatherRecord]]] = {}
+        
+        with self._cursor() as cursor:
+            cursor.execute('''
+                SELECT f.whl_port_code, f.issued_time, f.valid_time, f.local_time,
+                       f.wind_dir, f.wind_speed_kts, f.wind_gust_kts,
+                       f.wave_dir, f.wave_sig_m, f.wave_max_m, f.wave_period_s
+                FROM forecast_records f
+                JOIN (
+                    SELECT whl_port_code, MAX(issued_time) AS issued_time
+                    FROM weather_data GROUP BY whl_port_code
+                ) latest
+                  ON latest.whl_port_code = f.whl_port_code AND latest.issued_time = f.issued_time
+                ORDER BY f.whl_port_code, f.valid_time
+            ''')
+            for row in cursor:
+                whl_port_code, issued_time = row[0], row[1]
+                if wanted is not None and whl_port_code not in wanted:
+                    continue
+                record = WeatherRecord(
+                    time=datetime.strptime(row[3], "%Y-%m-%d %H:%M"),
+                    wind_direction=row[4],
+                    wind_speed_kts=row[5],
+                    wind_gust_kts=row[6],
+                    wave_direction=row[7],
+                    wave_height=row[8],
+                    wave_max=row[9],
+                    wave_period=row[10],
+                    utc_time=datetime.strptime(row[2], "%Y-%m-%d %H:%M")
+                )
+                forecasts.setdefault(whl_port_code, (issued_time, []))[1].append(record)
+        
+        return forecasts
 
     def get_latest_time(self, whl_port_code: str) -> Optional[str]:
         """
@@ -393,8 +1061,7 @@ class WeatherDatabase:
         Returns:
             發布時間字串或 None
         """
-        with sqlite3.connect(self.db_file) as conn:
-            cursor = conn.cursor()
+        with self._cursor() as cursor:
             cursor.execute(
                 'SELECT issued_time FROM weather_data WHERE whl_port_code = ? ORDER BY issued_time DESC LIMIT 1',
                 (whl_port_code,)
@@ -402,313 +1069,2492 @@ class WeatherDatabase:
             res = cursor.fetchone()
             return res[0] if res else None
 
-    def save_weather(self, wni_port_code: str, whl_port_code: str, port_name: str, 
-                    port_id: str, country: str, issued_time: str, content: str) -> bool:
+    def get_validators(self, station_id: str) -> Optional[Tuple[str, str]]:
         """
-        儲存氣象資料到資料庫
+        取得指定站點上次下載時的 HTTP 驗證資訊
         
         Args:
-            wni_port_code: WNI 港口代碼
-            whl_port_code: 萬海港口代碼
-            port_name: 港口名稱
-            port_id: 站點 ID
-            country: 國家
-            issued_time: 發布時間
-            content: 氣象內容
+            station_id: 站點 ID
             
         Returns:
-            bool: 儲存成功返回 True
+            Tuple[etag, last_modified] 或 None
+        """
+        with self._cursor() as cursor:
+            cursor.execute(
+                'SELECT etag, last_modified FROM http_validators WHERE station_id = ?',
+                (station_id,)
+            )
+            return cursor.fetchone()
+
+    def save_validators(self, station_id: str, etag: Optional[str], last_modified: Optional[str]) -> None:
+        """
+        儲存指定站點的 HTTP 驗證資訊（ETag / Last-Modified）
+        
+        Args:
+            station_id: 站點 ID
+            etag: ETag 標頭
+            last_modified: Last-Modified 標頭
         """
         try:
-            with sqlite3.connect(self.db_file) as conn:
-                cursor = conn.cursor()
+            with self._cursor(commit=True) as cursor:
                 cursor.execute('''
-                    INSERT OR REPLACE INTO weather_data 
-                    (port_name, wni_port_code, whl_port_code, country, station_id, issued_time, content, download_time)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-                ''', (port_name, wni_port_code, whl_port_code, country, port_id, issued_time, content))
-                conn.commit()
-            return True
+                    INSERT OR REPLACE INTO http_validators (station_id, etag, last_modified, updated_at)
+                    VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                ''', (station_id, etag, last_modified))
         except Exception as e:
             print(f"❌ 資料庫錯誤: {e}")
-            return False
 
-
-class PortWeatherCrawler:
-    """港口氣象資料爬蟲"""
-    
-    def __init__(self, username: str, password: str, excel_path: str = EXCEL_FILE_WANHAI, auto_login: bool = False):
+    def apply_retention(self, full_days: int = RETENTION_FULL_DAYS,
+                        daily_days: int = RETENTION_DAILY_DAYS) -> Dict[str, int]:
         """
-        初始化爬蟲
+        依保留政策刪除舊資料（各港口最新一筆永遠保留）
+        
+        - full_days 天內：保留所有發布
+        - full_days ~ daily_days 天：每個港口每天只保留最後一次發布
+        - 超過 daily_days 天：刪除
         
         Args:
-            username: Aedyn 帳號
-            password: Aedyn 密碼
-            excel_path: Excel 檔案路徑
-            auto_login: 是否強制重新登入
+            full_days: 保留所有發布的天數
+            daily_days: 保留每日一筆的天數
+            
+        Returns:
+            Dict[str, int]: 刪除筆數 {'weather_rows': n, 'forecast_rows': n, 'blobs': n, 'crawl_runs': n}
         """
-        self.excel_path = excel_path
-        self.db = WeatherDatabase()
-        self.session = self._create_session()
-        self.port_map: Dict[str, Dict[str, Any]] = {}
-        self.port_list: List[str] = []
-        self.login_manager = AedynLoginManager(username, password)
-        self.headers: Dict[str, str] = {}
-        
-        # 載入港口資料
-        self._load_port_map()
+        now = datetime.now(timezone.utc)
+        cutoff_full = (now - timedelta(days=full_days)).strftime("%Y%m%d_%H%M")
+        cutoff_all = (now - timedelta(days=daily_days)).strftime("%Y%m%d_%H%M")
         
-        # 智能登入：先嘗試載入舊 Cookie，如果無效才重新登入
-        self._smart_login(force_login=auto_login)
+        with self._cursor(commit=True) as cursor:
+            cursor.execute('''
+                DELETE FROM weather_data WHERE id IN (
+                    SELECT id FROM (
+                        SELECT id, issued_time,
+                               ROW_NUMBER() OVER (
+                                   PARTITION BY whl_port_code ORDER BY issued_time DESC
+                               ) AS port_rank,
+                               ROW_NUMBER() OVER (
+                                   PARTITION BY whl_port_code, substr(issued_time, 1, 8) ORDER BY issued_time DESC
+                               ) AS day_rank
+                        FROM weather_data
+                    )
+                    WHERE port_rank > 1
+                      AND (issued_time < ? OR (issued_time < ? AND day_rank > 1))
+                )
+            ''', (cutoff_all, cutoff_full))
+            weather_rows = cursor.rowcount
+            
+            cursor.execute('''
+                DELETE FROM forecast_records WHERE NOT EXISTS (
+                    SELECT 1 FROM weather_data w
+                    WHERE w.whl_port_code = forecast_records.whl_port_code
+                      AND w.issued_time = forecast_records.issued_time
+                )
+            ''')
+            forecast_rows = cursor.rowcount
+            
+            cursor.execute('''
+                DELETE FROM bulletin_blobs WHERE content_hash NOT IN (
+                    SELECT content_hash FROM weather_data WHERE content_hash IS NOT NULL
+                )
+            ''')
+            blobs = cursor.rowcount
+            
+            # 下載日誌只需要保留到可接續的範圍，超過 full_days 天一律刪除
+            cutoff_runs = f'-{full_days} days'
+            cursor.execute('''
+                DELETE FROM crawl_journal WHERE run_id IN (
+                    SELECT run_id FROM crawl_runs WHERE started_at < datetime('now', ?)
+                )
+            ''', (cutoff_runs,))
+            cursor.execute("DELETE FROM crawl_runs WHERE started_at < datetime('now', ?)", (cutoff_runs,))
+            crawl_runs = cursor.rowcount
+        
+        return {'weather_rows': weather_rows, 'forecast_rows': forecast_rows, 'blobs': blobs,
+                'crawl_runs': crawl_runs}
 
-    def _smart_login(self, force_login: bool = False) -> None:
+    def compact(self) -> Dict[str, int]:
         """
-        智能登入：只在需要時才登入
+        以 incremental vacuum 回收空頁並縮小資料庫檔案
+        
+        第一次執行時會將資料庫切換為 auto_vacuum=INCREMENTAL（需要一次完整 VACUUM），
+        之後只回收空頁，不必重寫整個檔案。
+        
+        Returns:
+            Dict[str, int]: {'size_bytes': 壓縮後大小, 'reclaimed_bytes': 回收的位元組數}
+        """
+        with self._lock:
+            conn = self._connection()
+            conn.commit()
+            
+            page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+            pages_before = conn.execute('PRAGMA page_count').fetchone()[0]
+            
+            if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+                conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+                conn.execute('VACUUM')
+            else:
+                conn.execute('PRAGMA incremental_vacuum').fetchall()
+            conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchall()
+            
+            pages_after = conn.execute('PRAGMA page_count').fetchone()[0]
+        
+        return {
+            'size_bytes': pages_after * page_size,
+            'reclaimed_bytes': (pages_before - pages_after) * page_size
+        }
+
+    def run_maintenance(self, full_days: int = RETENTION_FULL_DAYS,
+                        daily_days: int = RETENTION_DAILY_DAYS) -> Dict[str, int]:
+        """
+        套用保留政策並壓縮資料庫
         
         Args:
-            force_login: 是否強制重新登入
+            full_days: 保留所有發布的天數
+            daily_days: 保留每日一筆的天數
+            
+        Returns:
+            Dict[str, int]: 刪除筆數與回收的位元組數
         """
-        if force_login:
-            print("🔄 強制重新登入...")
-            self.refresh_cookies()
+        try:
+            deleted = self.apply_retention(full_days, daily_days)
+            result = {f"deleted_{key}": value for key, value in deleted.items()}
+            result.update(self.compact())
+            print(f"🧹 資料庫維護完成：刪除 {result['deleted_weather_rows']} 筆舊發布，"
+                  f"回收 {result['reclaimed_bytes'] / 1024:.1f} KB（目前 {result['size_bytes'] / 1024:.1f} KB）")
+            return result
+        except Exception as e:
+            print(f"⚠️ 資料庫維護失敗: {e}")
+            return {}
+
+    def start_crawl_run(self) -> str:
+        """
+        建立新的批次下載日誌
+        
+        Returns:
+            str: 執行 ID
+        """
+        run_id = f"{datetime.now():%Y%m%d_%H%M%S}_{os.getpid()}"
+        with self._cursor(commit=True) as cursor:
+            cursor.execute('INSERT OR REPLACE INTO crawl_runs (run_id) VALUES (?)', (run_id,))
+        return run_id
+
+    def finish_crawl_run(self, run_id: str) -> None:
+        """
+        標記批次下載已完整執行完畢（之後不會再被接續）
+        
+        Args:
+            run_id: 執行 ID
+        """
+        with self._cursor(commit=True) as cursor:
+            cursor.execute('UPDATE crawl_runs SET finished_at = CURRENT_TIMESTAMP WHERE run_id = ?', (run_id,))
+
+    def find_resumable_run(self, window_minutes: int = CRAWL_RESUME_WINDOW_MINUTES) -> Optional[str]:
+        """
+        找出可接續的批次下載：最近一次執行在時間範圍內開始且尚未完成
+        
+        Args:
+            window_minutes: 只接續幾分鐘內開始的執行
+            
+        Returns:
+            執行 ID 或 None（最近一次已完成或已過期）
+        """
+        with self._cursor() as cursor:
+            cursor.execute('''
+                SELECT run_id, finished_at FROM crawl_runs
+                WHERE started_at >= datetime('now', ?)
+                ORDER BY started_at DESC, run_id DESC LIMIT 1
+            ''', (f'-{window_minutes} minutes',))
+            res = cursor.fetchone()
+        return res[0] if res and res[1] is None else None
+
+    def get_completed_ports(self, run_id: str, window_minutes: int = CRAWL_RESUME_WINDOW_MINUTES) -> Dict[str, str]:
+        """
+        取得批次下載中已完成（且仍在時間範圍內）的港口
+        
+        Args:
+            run_id: 執行 ID
+            window_minutes: 幾分鐘內完成的港口才算數
+            
+        Returns:
+            Dict[str, str]: {港口代碼: 發布時間}
+        """
+        with self._cursor() as cursor:
+            cursor.execute('''
+                SELECT whl_port_code, issued_time FROM crawl_journal
+                WHERE run_id = ? AND status = 'done' AND updated_at >= datetime('now', ?)
+            ''', (run_id, f'-{window_minutes} minutes'))
+            return dict(cursor.fetchall())
+
+    def save_risk_levels(self, levels: List[Tuple[str, int, str]]) -> None:
+        """
+        記錄各港口最近一次的風險評估
+        
+        Args:
+            levels: (港口代碼, 風險等級 0~3, 評估所用資料的發布時間) 列表
+        """
+        if not levels:
             return
+        with self._cursor(commit=True) as cursor:
+            cursor.executemany('''
+                INSERT OR REPLACE INTO port_risk_levels (whl_port_code, risk_level, issued_time, assessed_at)
+                VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+            ''', levels)
+
+    def get_risk_levels(self) -> Dict[str, int]:
+        """
+        取得各港口最近一次評估的風險等級
         
-        print("\n🔍 檢查 Cookie 狀態...")
+        Returns:
+            Dict[港口代碼, 風險等級]（沒有評估紀錄的港口不在其中）
+        """
+        with self._cursor() as cursor:
+            cursor.execute('SELECT whl_port_code, risk_level FROM port_risk_levels')
+            return dict(cursor.fetchall())
+
+    def get_issued_history(self, limit_per_port: int = ISSUANCE_HISTORY_SIZE) -> Dict[str, List[str]]:
+        """
+        取得各港口最近幾次的發布時間
         
-        # 1. 嘗試載入已儲存的 Cookie
-        if self.login_manager.load_cookies():
-            # 2. 驗證 Cookie 是否有效
-            if self.login_manager.verify_cookies():
-                print("✅ 使用已儲存的 Cookie")
-                self.headers = self.login_manager.get_headers()
+        Args:
+            limit_per_port: 每個港口最多回傳的筆數
+            
+        Returns:
+            Dict[港口代碼, 發布時間列表（新到舊）]
+        """
+        history: Dict[str, List[str]] = {}
+        with self._cursor() as cursor:
+            cursor.execute(
+                'SELECT whl_port_code, issued_time FROM weather_data ORDER BY whl_port_code, issued_time DESC'
+            )
+            for whl_port_code, issued_time in cursor:
+                times = history.setdefault(whl_port_code, [])
+                if len(times) < limit_per_port:
+                    times.append(issued_time)
+        return history
+
+    def save_weather(self, wni_port_code: str, whl_port_code: str, port_name: str, 
+                    port_id: str, country: str, issued_time: str, content: str) -> bool:
+        """
+        儲存氣象資料到資料庫
+        
+        Args:
+            wni_port_code: WNI 港口代碼
+            whl_port_code: 萬海港口代碼
+            port_name: 港口名稱
+            port_id: 站點 ID
+            country: 國家
+            issued_time: 發布時間
+            content: 氣象內容
+            
+        Returns:
+            bool: 儲存成功返回 True
+        """
+        return self.save_weather_batch([{
+            'port_name': port_name,
+            'wni_port_code': wni_port_code,
+            'whl_port_code': whl_port_code,
+            'country': country,
+            'station_id': port_id,
+            'issued_time': issued_time,
+            'content': content,
+        }])
+
+    def save_weather_batch(self, rows: List[Dict[str, Any]],
+                           journal: Optional[List[Tuple[str, str, str]]] = None) -> bool:
+        """
+        在單一交易中批次儲存多筆氣象資料（連同 HTTP 驗證資訊與下載日誌）
+        
+        Args:
+            rows: 氣象資料列表，每筆包含 port_name, wni_port_code, whl_port_code,
+                  country, station_id, issued_time, content，
+                  可選 etag, last_modified 及已解析的逐時預報 forecast
+            journal: 下載日誌 (run_id, whl_port_code, status)，在資料寫入後於同一交易記錄，
+                     發布時間取自資料庫中該港口的最新資料
+            
+        Returns:
+            bool: 全部儲存成功返回 True（失敗時整批回滾）
+        """
+        if not rows and not journal:
+            return True
+        
+        validators = [
+            (row['station_id'], row.get('etag'), row.get('last_modified'))
+            for row in rows if row.get('etag') or row.get('last_modified')
+        ]
+        forecasts = [
+            dict(record, whl_port_code=row['whl_port_code'], issued_time=row['issued_time'])
+            for row in rows for record in row.get('forecast') or []
+        ]
+        
+        # 壓縮與雜湊在取得資料庫鎖之前完成
+        blobs = {}
+        packed_rows = []
+        for row in rows:
+            content_hash, blob = self._pack_content(row['content'])
+            blobs[content_hash] = blob
+            packed_rows.append(dict(row, content='', content_hash=content_hash))
+        
+        try:
+            with self._cursor(commit=True) as cursor:
+                cursor.executemany(
+                    'INSERT OR IGNORE INTO bulletin_blobs (content_hash, content) VALUES (?, ?)', blobs.items()
+                )
+                cursor.executemany('''
+                    INSERT OR REPLACE INTO weather_data 
+                    (port_name, wni_port_code, whl_port_code, country, station_id, issued_time, content, content_hash,
+                     download_time)
+                    VALUES (:port_name, :wni_port_code, :whl_port_code, :country, :station_id, :issued_time, :content,
+                            :content_hash, CURRENT_TIMESTAMP)
+                ''', packed_rows)
+                if forecasts:
+                    cursor.executemany('''
+                        INSERT OR REPLACE INTO forecast_records
+                        (whl_port_code, issued_time, valid_time, local_time,
+                         wind_dir, wind_speed_kts, wind_gust_kts,
+                         wave_dir, wave_sig_m, wave_max_m, wave_period_s,
+                         temp_c, precip_mmh, pressure_hpa, visibility, weather, sds)
+                        VALUES (:whl_port_code, :issued_time, :valid_time, :local_time,
+                                :wind_dir, :wind_speed_kts, :wind_gust_kts,
+                                :wave_dir, :wave_sig_m, :wave_max_m, :wave_period_s,
+                                :temp_c, :precip_mmh, :pressure_hpa, :visibility, :weather, :sds)
+                    ''', forecasts)
+                if validators:
+                    cursor.executemany('''
+                        INSERT OR REPLACE INTO http_validators (station_id, etag, last_modified, updated_at)
+                        VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                    ''', validators)
+                if journal:
+                    cursor.executemany('''
+                        INSERT OR REPLACE INTO crawl_journal (run_id, whl_port_code, status, issued_time, updated_at)
+                        VALUES (?1, ?2, ?3, (SELECT MAX(issued_time) FROM weather_data WHERE whl_port_code = ?2),
+                                CURRENT_TIMESTAMP)
+                    ''', journal)
+            return True
+        except Exception as e:
+            print(f"❌ 資料庫錯誤: {e}")
+            return False
+
+
+class WeatherWriteBuffer:
+    """
+    批次寫入緩衝區
+    
+    下載結果放入佇列後由單一寫入執行緒收集，累積 batch_size 筆或超過
+    flush_interval 秒就以一個交易寫入；關閉時（含程式結束）會寫入剩餘資料。
+    下載日誌與資料走同一個佇列，港口只會在自己的資料寫入後才被記為完成。
+    """
+    
+    _STOP = object()
+    
+    def __init__(self, db: WeatherDatabase, batch_size: int = WRITE_BATCH_SIZE,
+                 flush_interval: float = WRITE_FLUSH_SECONDS):
+        """
+        初始化寫入緩衝區並啟動寫入執行緒
+        
+        Args:
+            db: 氣象資料庫
+            batch_size: 累積幾筆就寫入一次
+            flush_interval: 第一筆進入後最久等待幾秒就寫入
+        """
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.failed_ports: List[str] = []
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="weather-writer", daemon=True)
+        self._thread.start()
+        # 程式異常結束時仍盡量寫入剩餘資料
+        atexit.register(self.close)
+
+    def __enter__(self) -> "WeatherWriteBuffer":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def put(self, row: Dict[str, Any]) -> None:
+        """
+        放入一筆待寫入的氣象資料（格式同 WeatherDatabase.save_weather_batch）
+        
+        Args:
+            row: 氣象資料
+        """
+        if self._closed:
+            raise RuntimeError("WeatherWriteBuffer 已關閉")
+        self._queue.put(row)
+
+    def mark(self, run_id: str, whl_port_code: str, status: str) -> None:
+        """
+        放入一筆下載日誌，與之前放入的資料一起（或之後）寫入
+        
+        Args:
+            run_id: 執行 ID
+            whl_port_code: 港口代碼
+            status: 下載結果 done / failed / stale
+        """
+        if self._closed:
+            raise RuntimeError("WeatherWriteBuffer 已關閉")
+        self._queue.put((run_id, whl_port_code, status))
+
+    def flush(self) -> None:
+        """立即寫入目前累積的資料，並等待寫入完成"""
+        if self._closed:
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+
+    def close(self) -> None:
+        """寫入剩餘資料並停止寫入執行緒"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(self._STOP)
+        self._thread.join()
+        atexit.unregister(self.close)
+
+    def _run(self) -> None:
+        """寫入執行緒：依筆數或時間條件批次寫入"""
+        batch: List[Dict[str, Any]] = []
+        deadline = 0.0
+        
+        while True:
+            timeout = max(0.0, deadline - time.monotonic()) if batch else None
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            
+            if item is self._STOP:
+                self._write(batch)
                 return
+            if isinstance(item, threading.Event):
+                self._write(batch)
+                batch = []
+                item.set()
+                continue
+            if item is not None:
+                if not batch:
+                    deadline = time.monotonic() + self.flush_interval
+                batch.append(item)
+            
+            if batch and (len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                self._write(batch)
+                batch = []
+
+    def _write(self, batch: List[Any]) -> None:
+        """
+        以單一交易寫入一批資料
+        
+        Args:
+            batch: 氣象資料與下載日誌列表
+        """
+        if not batch:
+            return
+        rows = [item for item in batch if isinstance(item, dict)]
+        journal = [item for item in batch if isinstance(item, tuple)]
+        if self.db.save_weather_batch(rows, journal):
+            self.written += len(rows)
+        else:
+            self.failed_ports.extend(row['whl_port_code'] for row in rows)
+
+
+class _DeadlineRetry(Retry):
+    """退避時間不超過時間預算剩餘秒數的 urllib3 Retry"""
+
+    def __init__(self, *args, remaining: Optional[Callable[[], float]] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.remaining = remaining
+
+    def new(self, **kwargs) -> '_DeadlineRetry':
+        retry = super().new(**kwargs)
+        retry.remaining = self.remaining
+        return retry
+
+    def get_backoff_time(self) -> float:
+        backoff = super().get_backoff_time()
+        if self.remaining is not None:
+            backoff = min(backoff, self.remaining())
+        return backoff
+
+
+_connect_timing = threading.local()
+
+
+class _TimedHTTPConnection(urllib3.connection.HTTPConnection):
+    """記錄建立連線（含 DNS 查詢）耗時的 HTTP 連線，供逐請求量測使用"""
+
+    def connect(self) -> None:
+        start = time.perf_counter()
+        super().connect()
+        _connect_timing.seconds = time.perf_counter() - start
+
+
+class _TimedHTTPSConnection(urllib3.connection.HTTPSConnection):
+    """記錄建立連線（含 DNS 查詢與 TLS 交握）耗時的 HTTPS 連線"""
+
+    def connect(self) -> None:
+        start = time.perf_counter()
+        super().connect()
+        _connect_timing.seconds = time.perf_counter() - start
+
+
+class _TimedHTTPConnectionPool(urllib3.HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(urllib3.HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+def _close_response(future: Future) -> None:
+    """關閉 hedging 落後請求的串流回應，讓連線回到連線池"""
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    解析 Retry-After 標頭（秒數或 HTTP 日期）
+    
+    Args:
+        value: 標頭內容
+        
+    Returns:
+        float: 需等待的秒數，無法解析返回 None
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class Deadline:
+    """
+    整次執行的時間預算
+    
+    各階段以剩餘時間縮短逾時；預算用完後不再發送新請求，改用資料庫中的舊資料。
+    """
+
+    def __init__(self, seconds: Optional[float] = None):
+        """
+        初始化時間預算（從建立時開始計時）
+        
+        Args:
+            seconds: 預算秒數（None 或 0 表示不限制）
+        """
+        self.seconds = seconds or None
+        self._end = time.monotonic() + seconds if seconds else None
+
+    def remaining(self) -> float:
+        """剩餘秒數（不限制時為無限大）"""
+        if self._end is None:
+            return math.inf
+        return max(0.0, self._end - time.monotonic())
+
+    def expired(self) -> bool:
+        """預算是否已用完"""
+        return self.remaining() <= 0
+
+    def timeout(self, cap: float, floor: float = 0.1) -> float:
+        """
+        單一操作的逾時秒數
+        
+        Args:
+            cap: 原本的逾時上限
+            floor: 逾時下限（預算將盡時仍給操作最少這麼多時間）
+            
+        Returns:
+            float: min(cap, 剩餘秒數)，但不小於 floor
+        """
+        return max(floor, min(cap, self.remaining()))
+
+    def reserve(self, seconds: float) -> 'Deadline':
+        """
+        保留時間給後續階段：返回提早 seconds 秒結束的子預算
+        
+        Args:
+            seconds: 保留秒數
+            
+        Returns:
+            Deadline: 子預算
+        """
+        child = Deadline()
+        if self._end is not None:
+            child._end = self._end - seconds
+            child.seconds = max(0.0, self.seconds - seconds)
+        return child
+
+
+class DeadlineExceeded(Exception):
+    """請求還沒發送就會超過時間預算"""
+
+
+class AdaptiveRateLimiter:
+    """
+    AIMD 自適應限速器（所有下載共用）
+    
+    第一次被節流前每次成功乘法提高速率（slow start），之後每次成功加法提高、遇到 429/5xx 時乘法降低；
+    有 Retry-After 時在指定時間前不放行任何請求。
+    reserve() 只預約發送時間不阻塞，同步與 asyncio 版本各自負責等待。
+    """
+
+    def __init__(self, rate: float = RATE_LIMIT_INITIAL, min_rate: float = RATE_LIMIT_MIN,
+                 max_rate: float = RATE_LIMIT_MAX, increase: float = RATE_LIMIT_INCREASE,
+                 decrease: float = RATE_LIMIT_DECREASE):
+        """
+        初始化限速器
+        
+        Args:
+            rate: 起始速率（請求/秒）
+            min_rate: 速率下限
+            max_rate: 速率上限
+            increase: 每次成功增加的速率
+            decrease: 遇到節流時速率乘上的倍數
+        """
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.requests = 0
+        self.throttled = 0
+        self._slow_start = True
+        self._next_slot = 0.0
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        預約下一個發送時段
+        
+        Returns:
+            float: 呼叫端需等待的秒數
+        """
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot, self._blocked_until)
+            self._next_slot = slot + 1.0 / self.rate
+            self.requests += 1
+            return slot - now
+
+    def acquire(self, deadline: Optional[Deadline] = None) -> bool:
+        """
+        預約並等待到可發送（同步版本）
+        
+        Args:
+            deadline: 時間預算，需要等待的時間超過剩餘預算時不等待
+            
+        Returns:
+            bool: 可以發送返回 True；等不到就會超過時間預算返回 False
+        """
+        delay = self.reserve()
+        if deadline is not None and delay >= deadline.remaining():
+            return False
+        if delay > 0:
+            time.sleep(delay)
+        return True
+
+    def on_success(self) -> None:
+        """請求成功：提高速率"""
+        with self._lock:
+            if self._slow_start:
+                self.rate = min(self.max_rate, self.rate * RATE_LIMIT_SLOW_START)
             else:
-                print("⚠️ Cookie 已失效，需要重新登入")
+                self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttle(self, retry_after: Optional[float] = None) -> None:
+        """
+        遇到 429/5xx：乘法降低速率
         
-        # 3. Cookie 不存在或已失效，執行登入
-        print("🔐 執行登入流程...")
-        self.refresh_cookies()
+        Args:
+            retry_after: 伺服器要求等待的秒數
+        """
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self.throttled += 1
+            self._slow_start = False
+            if retry_after:
+                self._blocked_until = max(self._blocked_until, time.monotonic() + retry_after)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """目前狀態（供執行報告使用）"""
+        with self._lock:
+            return {
+                'rate': round(self.rate, 2),
+                'requests': self.requests,
+                'throttled': self.throttled
+            }
+
+
+class CircuitBreaker:
+    """
+    斷路器：API 連續失敗時暫停所有下載，冷卻後放行一個試探請求
+    
+    closed（正常）→ 連續失敗達門檻 → open（直接拒絕）→ 冷卻結束 → half_open（試探）
+    → 試探成功回到 closed，失敗則重新 open
+    
+    下載端以 wait_time 等待冷卻結束再送出試探；試探連續失敗 max_failed_probes 次後放棄等待。
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+    PROBE = 'probe'  # allow() 放行試探請求時的返回值（視為 True）
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 cooldown_seconds: float = BREAKER_COOLDOWN_SECONDS,
+                 max_failed_probes: int = BREAKER_MAX_FAILED_PROBES):
+        """
+        初始化斷路器
+        
+        Args:
+            failure_threshold: 連續失敗幾次開啟
+            cooldown_seconds: 開啟後多久進入試探
+            max_failed_probes: 試探連續失敗幾次後不再等待冷卻
+        """
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.max_failed_probes = max_failed_probes
+        self.failed_probes = 0
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.trips = 0
+        self.rejected = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> Union[bool, str]:
+        """
+        是否放行請求
+        
+        Returns:
+            可送出請求返回 True；放行的是 half_open 的試探請求時返回 PROBE，
+            呼叫端沒有記錄結果（record_success / record_failure）就結束時須呼叫 release_probe
+        """
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown_seconds:
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return self.PROBE
+            
+            self.rejected += 1
+            return False
+
+    def release_probe(self) -> None:
+        """試探請求未取得結果就結束（例如時間預算用完）：讓下一個請求接手試探"""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probe_in_flight = False
+
+    def wait_time(self) -> Optional[float]:
+        """
+        距離可以再呼叫 allow 的秒數
+        
+        Returns:
+            float: closed 時為 0，open 時為剩餘冷卻時間，試探進行中為 BREAKER_PROBE_POLL_SECONDS；
+                   試探已連續失敗 max_failed_probes 次時返回 None（不必等待）
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return 0.0
+            if self.failed_probes >= self.max_failed_probes:
+                return None
+            if self.state == self.OPEN:
+                return max(0.0, self.cooldown_seconds - (time.monotonic() - self._opened_at))
+            return BREAKER_PROBE_POLL_SECONDS if self._probe_in_flight else 0.0
+
+    def rearm(self) -> None:
+        """新的批次下載開始：重新允許等待冷卻與試探"""
+        with self._lock:
+            self.failed_probes = 0
+            self._probe_in_flight = False
+
+    def record_success(self) -> None:
+        """API 正常回應"""
+        with self._lock:
+            if self.state != self.CLOSED:
+                print("✅ API 已恢復，斷路器關閉")
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self.failed_probes = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        """API 回應 5xx 或連線失敗"""
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN:
+                self.failed_probes += 1
+            if self.state == self.HALF_OPEN or (
+                self.state == self.CLOSED and self.consecutive_failures >= self.failure_threshold
+            ):
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+                self.trips += 1
+                print(f"🛑 API 連續失敗 {self.consecutive_failures} 次，斷路器開啟，暫停下載 {self.cooldown_seconds} 秒")
+
+    def snapshot(self) -> Dict[str, Any]:
+        """目前狀態（供執行報告使用）"""
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'trips': self.trips,
+                'rejected': self.rejected,
+                'failed_probes': self.failed_probes
+            }
+
+
+class LatencyTracker:
+    """記錄本次批次的回應時間，推估 hedging 的等待門檻"""
+
+    def __init__(self, percentile: float = HEDGE_PERCENTILE, min_samples: int = HEDGE_MIN_SAMPLES,
+                 min_delay: float = HEDGE_MIN_DELAY):
+        """
+        初始化回應時間統計
+        
+        Args:
+            percentile: 等待門檻採用的百分位數（0~1）
+            min_samples: 至少累積幾筆才給出門檻
+            min_delay: 門檻下限（秒）
+        """
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.samples: List[float] = []
+        self._delay: Optional[float] = None
+        self._computed_at = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        """記錄一次成功回應的耗時"""
+        with self._lock:
+            self.samples.append(seconds)
+
+    def hedge_delay(self) -> Optional[float]:
+        """
+        目前的 hedging 等待門檻
+        
+        Returns:
+            float: 秒數，樣本不足時返回 None
+        """
+        with self._lock:
+            count = len(self.samples)
+            if count < self.min_samples:
+                return None
+            # 樣本增加超過一成才重新排序計算
+            if self._delay is None or count - self._computed_at >= max(1, self._computed_at // 10):
+                ordered = sorted(self.samples)
+                index = min(count - 1, int(count * self.percentile))
+                self._delay = max(self.min_delay, ordered[index])
+                self._computed_at = count
+            return self._delay
+
+
+class FetchMetrics:
+    """
+    批次下載的逐請求量測
+    
+    每個站點請求記錄各階段耗時（排隊與限速等待、DNS、建立連線、TTFB、讀取內容、總計）、
+    位元組數、狀態碼、重試次數與結果，批次結束後彙整成百分位數寫入執行報告。
+    """
+
+    PHASES = ('wait_ms', 'dns_ms', 'connect_ms', 'ttfb_ms', 'body_ms', 'total_ms')
+    PERCENTILES = (50, 90, 95, 99)
+
+    def __init__(self):
+        """初始化量測（每次批次下載重新建立）"""
+        self.samples: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def record(self, sample: Dict[str, Any]) -> None:
+        """
+        記錄一個站點請求
+        
+        Args:
+            sample: station, ports, status, retries, bytes, result 及 PHASES 中的各階段耗時（毫秒，未量到為 None）
+        """
+        with self._lock:
+            self.samples.append(sample)
+
+    @staticmethod
+    def result_label(success: bool, message: str) -> str:
+        """
+        將下載結果分類
+        
+        Args:
+            success: 是否成功
+            message: 結果訊息
+            
+        Returns:
+            str: updated / skip / aborted / fail / stale
+        """
+        if not success:
+            return 'stale' if message == STALE_MESSAGE else 'fail'
+        if "中止下載" in message:
+            return 'aborted'
+        return 'skip' if "已是最新" in message else 'updated'
+
+    @classmethod
+    def percentiles(cls, values: List[float]) -> Dict[str, float]:
+        """
+        計算百分位數（nearest-rank）
+        
+        Args:
+            values: 數值列表（不可為空）
+            
+        Returns:
+            Dict: {'count': n, 'p50': x, 'p90': x, 'p95': x, 'p99': x, 'max': x}
+        """
+        ordered = sorted(values)
+        count = len(ordered)
+        result: Dict[str, float] = {'count': count}
+        for p in cls.PERCENTILES:
+            result[f'p{p}'] = round(ordered[max(0, math.ceil(count * p / 100) - 1)], 1)
+        result['max'] = round(ordered[-1], 1)
+        return result
+
+    def summary(self, slowest: int = FETCH_METRICS_SLOWEST) -> Dict[str, Any]:
+        """
+        彙整本次批次的量測結果
+        
+        Args:
+            slowest: 列出最慢的幾個站點
+            
+        Returns:
+            Dict: requests, bytes, retries, status, results, latency_ms（各階段百分位數）, slowest
+        """
+        with self._lock:
+            samples = list(self.samples)
+        sent = [sample for sample in samples if sample['status'] is not None]
+        
+        status: Dict[str, int] = {}
+        results: Dict[str, int] = {}
+        for sample in samples:
+            results[sample['result']] = results.get(sample['result'], 0) + 1
+            if sample['status'] is not None:
+                key = str(sample['status'])
+                status[key] = status.get(key, 0) + 1
+        
+        latency = {}
+        for phase in self.PHASES:
+            values = [sample[phase] for sample in sent if sample.get(phase) is not None]
+            if values:
+                latency[phase] = self.percentiles(values)
+        
+        return {
+            'requests': len(sent),
+            'bytes': sum(sample['bytes'] for sample in sent),
+            'retries': sum(sample['retries'] for sample in sent),
+            'status': status,
+            'results': results,
+            'latency_ms': latency,
+            'slowest': [
+                {key: sample.get(key) for key in ('station', 'ports', 'status', 'result', 'retries', 'bytes',
+                                                  'ttfb_ms', 'body_ms', 'total_ms')}
+                for sample in sorted(sent, key=lambda x: x['total_ms'], reverse=True)[:slowest]
+            ],
+        }
+
+
+class IssuanceScheduler:
+    """依各港口的歷史發布間隔推估下一次發布時間，略過尚未到期的港口"""
+    
+    def __init__(self, db: WeatherDatabase):
+        """
+        初始化排程器
+        
+        Args:
+            db: 氣象資料庫
+        """
+        self.db = db
+        self.last_issued: Dict[str, datetime] = {}
+        self.cadence: Dict[str, timedelta] = {}
+
+    @staticmethod
+    def parse_issued(issued_time: str) -> Optional[datetime]:
+        """
+        將資料庫中的發布時間（YYYYMMDD_HHMM, UTC）轉成 datetime
+        
+        Args:
+            issued_time: 發布時間字串
+            
+        Returns:
+            datetime 或 None（格式不符時）
+        """
+        try:
+            return datetime.strptime(issued_time, "%Y%m%d_%H%M")
+        except (TypeError, ValueError):
+            return None
+
+    def learn(self) -> None:
+        """
+        從資料庫的發布歷史學習各港口的發布週期
+        
+        資料庫中相鄰發布的間隔取決於我們何時下載（例如 00/08 UTC 下載 6 小時發布一次的港口，
+        間隔會是 18h、6h 交替），所以不能取中位數。間隔以小時取整後取最大公因數作為週期，
+        且該週期至少要實際出現 MIN_CADENCE_OBSERVATIONS 次才採信；沒有把握的港口不記錄週期，
+        is_due 一律視為到期。
+        """
+        self.last_issued.clear()
+        self.cadence.clear()
+        
+        min_cadence = timedelta(hours=MIN_ISSUANCE_CADENCE_HOURS)
+        max_cadence = timedelta(hours=MAX_ISSUANCE_CADENCE_HOURS)
+        
+        for whl_port_code, issued_times in self.db.get_issued_history().items():
+            parsed = [t for t in map(self.parse_issued, issued_times) if t]
+            if not parsed:
+                continue
+            
+            self.last_issued[whl_port_code] = parsed[0]
+            hours = [round((newer - older).total_seconds() / 3600) for newer, older in zip(parsed, parsed[1:])]
+            hours = [h for h in hours if h > 0]
+            if len(hours) < MIN_ISSUANCE_INTERVALS:
+                continue
+            cadence_hours = math.gcd(*hours)
+            if hours.count(cadence_hours) < MIN_CADENCE_OBSERVATIONS:
+                continue
+            cadence = timedelta(hours=cadence_hours)
+            self.cadence[whl_port_code] = min(max(cadence, min_cadence), max_cadence)
+
+    def next_issuance(self, whl_port_code: str) -> Optional[datetime]:
+        """
+        推估指定港口下一次發布的時間（UTC）
+        
+        Args:
+            whl_port_code: 港口代碼
+            
+        Returns:
+            datetime 或 None（歷史不足以推估時）
+        """
+        if whl_port_code not in self.cadence:
+            return None
+        return self.last_issued[whl_port_code] + self.cadence[whl_port_code]
+
+    def is_due(self, whl_port_code: str, now: Optional[datetime] = None) -> bool:
+        """
+        判斷指定港口是否可能已有新的發布
+        
+        Args:
+            whl_port_code: 港口代碼
+            now: 目前時間（UTC），預設為現在
+            
+        Returns:
+            bool: 可能已有新發布（或無法推估）時返回 True
+        """
+        next_time = self.next_issuance(whl_port_code)
+        if next_time is None:
+            return True
+        if now is None:
+            now = datetime.now(timezone.utc).replace(tzinfo=None)
+        return now >= next_time
+
+
+class PortWeatherCrawler:
+    """港口氣象資料爬蟲"""
+    
+    def __init__(self, username: str, password: str, excel_path: str = EXCEL_FILE_WANHAI, auto_login: bool = False,
+                 db: Optional[WeatherDatabase] = None, cookie_file: str = COOKIE_FILE,
+                 deadline: Optional[Deadline] = None):
+        """
+        初始化爬蟲
+        
+        Args:
+            username: Aedyn 帳號
+            password: Aedyn 密碼
+            excel_path: Excel 檔案路徑
+            auto_login: 是否強制重新登入
+            db: 共用的氣象資料庫（預設自行建立）
+            cookie_file: Cookie 儲存檔案路徑（可由多個程序共用）
+            deadline: 初始化時登入的時間預算（驗證 Cookie、等待其他行程登入與登入請求都受其限制）
+        """
+        self.excel_path = excel_path
+        self.db = db if db is not None else WeatherDatabase()
+        self.parser = WeatherParser()
+        self.scheduler = IssuanceScheduler(self.db)
+        self.session = self._create_session()
+        self.port_map: Dict[str, Dict[str, Any]] = {}
+        self.port_list: List[str] = []
+        self.login_manager = AedynLoginManager(username, password, cookie_file=cookie_file)
+        self.headers: Dict[str, str] = {}
+        self._host_slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._host_slots_lock = threading.Lock()
+        self._writer: Optional[WeatherWriteBuffer] = None
+        self._refresh_timer: Optional[threading.Timer] = None
+        self._last_run_seconds = 0.0
+        # 重新登入採 single-flight：同時遇到 401 的請求只會觸發一次登入
+        self._auth_lock = threading.RLock()
+        self._auth_generation = 0   # 每次登入嘗試後遞增，請求送出前記下當時的值
+        self._auth_ok = True        # 最近一次登入嘗試的結果，供等待中的請求共用
+        self.login_count = 0
+        self.rate_limiter = AdaptiveRateLimiter()
+        self.breaker = CircuitBreaker()
+        self._run_requests_start = 0
+        self.latency = LatencyTracker()
+        self.hedge_stats = {'fired': 0, 'won': 0}
+        self._hedging = False
+        self._hedge_pool: Optional[ThreadPoolExecutor] = None
+        self._hedge_lock = threading.Lock()
+        self._deadline = Deadline()
+        self.stale_ports: List[str] = []
+        self.run_id: Optional[str] = None
+        self.fetch_metrics = FetchMetrics()
+        self.priority_ports: List[str] = []   # 本次下載中上次評估有風險的港口（最先下載）
+        self._priority_pending: set = set()
+        self._on_priority_done: Optional[Callable[[List[str]], None]] = None
+        
+        # 載入港口資料
+        self._load_port_map()
+        
+        # 智能登入：先嘗試載入舊 Cookie，如果無效才重新登入
+        self._deadline = deadline or Deadline()
+        try:
+            self._smart_login(force_login=auto_login)
+        finally:
+            self._deadline = Deadline()
+
+    def _smart_login(self, force_login: bool = False) -> None:
+        """
+        智能登入：只在需要時才登入
+        
+        Args:
+            force_login: 是否強制重新登入
+        """
+        if force_login:
+            print("🔄 強制重新登入...")
+            # 先記下目前檔案中的 Cookie，避免被當成其他程序剛更新的而直接沿用
+            self.login_manager.load_cookies()
+            self.refresh_cookies()
+            return
+        
+        print("\n🔍 檢查 Cookie 狀態...")
+        
+        # 1. 嘗試載入已儲存的 Cookie
+        if self.login_manager.load_cookies():
+            # 2. JWT 距到期還久就不必線上驗證
+            if self.login_manager.is_token_fresh():
+                print("✅ JWT 尚未到期，略過線上驗證，使用已儲存的 Cookie")
+                self.headers = self.login_manager.get_headers()
+                self._schedule_token_refresh()
+                return
+            
+            # 3. 驗證 Cookie 是否有效
+            if self.login_manager.verify_cookies(timeout=self._deadline.timeout(10)):
+                print("✅ 使用已儲存的 Cookie")
+                self.headers = self.login_manager.get_headers()
+                self._schedule_token_refresh()
+                return
+            else:
+                print("⚠️ Cookie 已失效，需要重新登入")
+        
+        # 4. Cookie 不存在或已失效，執行登入
+        print("🔐 執行登入流程...")
+        self.refresh_cookies()
+
+    def _create_session(self) -> requests.Session:
+        """
+        建立 requests session 並設定重試機制
+        
+        Returns:
+            requests.Session: 設定好的 session
+        """
+        session = requests.Session()
+        # 429/5xx 不交給 urllib3 重試，由 _limited_get 回饋給限速器與斷路器後再重試；
+        # 讀取逾時也不重試（直接以 Timeout 拋出），連線重試的退避不超過剩餘的時間預算
+        retry = _DeadlineRetry(
+            total=MAX_RETRIES,
+            read=False,
+            backoff_factor=1,
+            status_forcelist=(),
+            remaining=lambda: self._deadline.remaining()
+        )
+        # 連線池大小與每主機併發上限一致，讓併發下載能重複使用連線
+        adapter = HTTPAdapter(max_retries=retry, pool_maxsize=MAX_PER_HOST)
+        # 量測每次建立連線的耗時（重複使用的連線不計）
+        adapter.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def _host_slot(self, url: str) -> threading.BoundedSemaphore:
+        """
+        取得指定網址所屬主機的併發限制 Semaphore
+        
+        Args:
+            url: 請求網址
+            
+        Returns:
+            threading.BoundedSemaphore: 該主機的 Semaphore
+        """
+        host = urlparse(url).netloc
+        with self._host_slots_lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(MAX_PER_HOST)
+            return self._host_slots[host]
+
+    def refresh_cookies(self, headless: bool = True) -> bool:
+        """
+        重新登入並更新 Cookie 和 JWT Token（同一時間只會有一個登入在進行）
+        
+        Args:
+            headless: 是否使用無頭模式
+            
+        Returns:
+            bool: 更新成功返回 True
+        """
+        with self._auth_lock:
+            self.login_count += 1
+            ok = self._login(headless)
+            self._auth_generation += 1
+            self._auth_ok = ok
+            return ok
+
+    def _refresh_after_auth_error(self, seen_generation: int) -> bool:
+        """
+        請求遇到 401/403 時重新登入；若請求送出後已有其他執行緒完成登入，直接沿用其結果
+        
+        Args:
+            seen_generation: 請求送出前的 _auth_generation
+            
+        Returns:
+            bool: 目前的憑證可用返回 True
+        """
+        with self._auth_lock:
+            if self._auth_generation != seen_generation:
+                return self._auth_ok
+            if self._deadline.expired():
+                return False
+            print("⚠️ Cookie 已過期，正在重新登入...")
+            return self.refresh_cookies()
+
+    def _request_timeout(self) -> float:
+        """單一請求的逾時：TIMEOUT 與本次執行剩餘時間取小"""
+        return self._deadline.timeout(TIMEOUT)
+
+    def _mark_stale(self, whl_port_codes: List[str]) -> Dict[str, Tuple[bool, str]]:
+        """
+        記錄因超過時間預算而未更新的港口（分析時沿用資料庫中的舊資料）
+        
+        Args:
+            whl_port_codes: 港口代碼列表
+            
+        Returns:
+            Dict[str, Tuple[bool, str]]: 各港口代碼的 (False, STALE_MESSAGE)
+        """
+        self.stale_ports.extend(whl_port_codes)
+        return {code: (False, STALE_MESSAGE) for code in whl_port_codes}
+
+    def _login(self, headless: bool) -> bool:
+        """
+        執行登入並更新 Headers（由 refresh_cookies 在鎖內呼叫）
+        
+        Args:
+            headless: 是否使用無頭模式
+            
+        Returns:
+            bool: 更新成功返回 True
+        """
+        try:
+            print("\n🔄 正在更新 Cookie 和 JWT Token...")
+            result = self.login_manager.login(headless=headless, timeout=self._request_timeout(),
+                                              lock_timeout=self._deadline.timeout(CREDENTIAL_LOCK_TIMEOUT))
+            self.headers = self.login_manager.get_headers()
+            
+            print("\n📋 取得的 Headers:")
+            print(f"   Cookie 數量: {len(result['cookies'])}")
+            print(f"   JWT Token: {'✅ 已取得' if result['jwt_token'] else '❌ 未取得'}")
+            
+            # 顯示部分 Cookie 名稱
+            if result['cookies']:
+                cookie_names = list(result['cookies'].keys())[:5]
+                print(f"   Cookie 範例: {', '.join(cookie_names)}...")
+            
+            print("✅ Headers 已更新\n")
+            self._schedule_token_refresh()
+            return True
+        except Exception as e:
+            print(f"❌ Cookie 更新失敗: {e}")
+            return False
+
+    def _schedule_token_refresh(self, delay: Optional[float] = None) -> None:
+        """
+        安排在 JWT 到期前於背景重新登入，避免批次下載途中才遇到 401
+        
+        Args:
+            delay: 幾秒後更新（預設為到期前 TOKEN_REFRESH_MARGIN_MINUTES 分鐘）
+        """
+        self.stop_token_refresh()
+        if delay is None:
+            remaining = self.login_manager.seconds_until_expiry()
+            if remaining is None:
+                return
+            # Token 有效期比預留時間還短時，改在剩餘時間過半時更新，避免連續重新登入
+            delay = max(0.0, remaining - min(TOKEN_REFRESH_MARGIN_MINUTES * 60, remaining / 2))
+        
+        self._refresh_timer = threading.Timer(delay, self._background_refresh)
+        self._refresh_timer.daemon = True
+        self._refresh_timer.start()
+        refresh_at = datetime.now() + timedelta(seconds=delay)
+        print(f"⏰ 已排程於 {refresh_at.strftime('%Y-%m-%d %H:%M:%S')} 主動更新 JWT Token")
+
+    def _background_refresh(self) -> None:
+        """背景執行緒：重新登入，失敗時在 Token 仍有效前持續重試"""
+        print("\n⏰ JWT Token 即將到期，背景重新登入...")
+        if self.refresh_cookies():
+            return
+        remaining = self.login_manager.seconds_until_expiry()
+        if remaining is not None and remaining > TOKEN_REFRESH_RETRY_SECONDS:
+            self._schedule_token_refresh(TOKEN_REFRESH_RETRY_SECONDS)
+
+    def stop_token_refresh(self) -> None:
+        """取消已排程的背景更新"""
+        if self._refresh_timer is not None:
+            self._refresh_timer.cancel()
+            self._refresh_timer = None
+
+    def _ensure_token_for_run(self) -> None:
+        """
+        批次下載前確認 JWT 撐得過整個批次（以上次批次耗時估計），否則先行更新
+        """
+        remaining = self.login_manager.seconds_until_expiry()
+        if remaining is None:
+            return
+        needed = TOKEN_REFRESH_MARGIN_MINUTES * 60 + self._last_run_seconds
+        if remaining < needed:
+            print(f"🔄 JWT Token 將於 {remaining / 60:.1f} 分鐘內到期，先更新再開始下載")
+            self.refresh_cookies()
+
+    def _load_port_map(self) -> None:
+        """一次性載入所有港口資訊（含經緯度），Excel 未變更時直接使用編譯好的快取"""
+        if not os.path.exists(self.excel_path):
+            print(f"⚠️ 找不到 {self.excel_path}，請確認檔案位置。")
+            return
+
+        try:
+            ports = self._load_port_registry_cache()
+            if ports is None:
+                ports = self._read_port_excel()
+                self._save_port_registry_cache(ports)
+            
+            for code, info in ports:
+                self.port_map[code] = info
+                self.port_list.append(code)
+            
+            print(f"✅ 已載入 {len(self.port_map)} 個港口資料")
+            
+        except Exception as e:
+            print(f"❌ 讀取 Excel 失敗: {e}")
+            import traceback
+            traceback.print_exc()
+
+    def _read_port_excel(self) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        讀取 Excel 港口清單
+        
+        Returns:
+            List[Tuple[港口代碼, 港口資訊]]（保留 Excel 中的順序）
+        """
+        import pandas as pd
+        
+        print("⏳ 正在載入港口資料...")
+        df = pd.read_excel(self.excel_path, sheet_name='all_ports_list')
+        
+        # 清理欄位名稱（去除前後空格）
+        df.columns = df.columns.str.strip()
+        
+        ports = []
+        for _, row in df.iterrows():
+            code = str(row['Port_Code_5']).strip()
+            obj_id = str(row['Station ID (Object_ID)']).strip()
+            
+            if code and obj_id and obj_id != 'nan':
+                # 處理經緯度：先轉為 float，若為 NaN 則設為 0.0
+                try:
+                    lat = float(row.get('Lat', 0.0))
+                    lat = 0.0 if math.isnan(lat) else lat
+                except (ValueError, TypeError):
+                    lat = 0.0
+                    
+                try:
+                    lon = float(row.get('Lon', 0.0))
+                    lon = 0.0 if math.isnan(lon) else lon
+                except (ValueError, TypeError):
+                    lon = 0.0
+
+                ports.append((code, {
+                    'id': obj_id,
+                    'name': str(row['Port Name']).strip(),
+                    'wni_code': str(row.get('WNI Port Code', code)).strip(),
+                    'country': str(row.get('Country', 'N/A')),
+                    'latitude': lat,
+                    'longitude': lon
+                }))
+        return ports
+
+    @property
+    def port_registry_cache_path(self) -> str:
+        """編譯後港口清單快取的檔案路徑"""
+        return os.path.splitext(self.excel_path)[0] + PORT_REGISTRY_CACHE_SUFFIX
+
+    @property
+    def port_registry_stamp_path(self) -> str:
+        """記錄 Excel 修改時間的檔案路徑（本機專用）"""
+        return self.port_registry_cache_path + PORT_REGISTRY_CACHE_STAMP_SUFFIX
+
+    def _excel_sha256(self) -> str:
+        """
+        計算 Excel 檔案的 SHA-256
+        
+        Returns:
+            str: 十六進位雜湊值
+        """
+        with open(self.excel_path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+
+    def _load_port_registry_cache(self) -> Optional[List[Tuple[str, Dict[str, Any]]]]:
+        """
+        讀取港口清單快取
+        
+        快取只記錄 Excel 的大小與雜湊（納入版控，全新 checkout 也能直接使用）；
+        本機的修改時間另記在 stamp 檔，相同時略過雜湊計算。
+        
+        Returns:
+            港口列表，快取不存在或已過期時回傳 None
+        """
+        cache_path = self.port_registry_cache_path
+        if not os.path.exists(cache_path):
+            return None
+        
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+            if cache.get('version') != PORT_REGISTRY_CACHE_VERSION:
+                return None
+            
+            source = cache['source']
+            stat = os.stat(self.excel_path)
+            if source['size'] != stat.st_size:
+                return None
+            if self._read_port_registry_stamp() != [stat.st_mtime_ns, source['sha256']]:
+                # 修改時間不同（例如 git checkout 後）但內容可能沒變，改以雜湊確認；不改寫快取本身
+                if source['sha256'] != self._excel_sha256():
+                    return None
+                self._write_port_registry_stamp(stat.st_mtime_ns, source['sha256'])
+            
+            return [(code, info) for code, info in cache['ports']]
+        except Exception as e:
+            print(f"⚠️ 港口清單快取讀取失敗，改為重新讀取 Excel: {e}")
+            return None
+
+    def _save_port_registry_cache(self, ports: List[Tuple[str, Dict[str, Any]]],
+                                  sha256: Optional[str] = None) -> None:
+        """
+        寫入港口清單快取（先寫暫存檔再置換，避免留下寫到一半的檔案）
+        
+        Args:
+            ports: 港口列表
+            sha256: Excel 的雜湊（未提供時重新計算）
+        """
+        cache_path = self.port_registry_cache_path
+        try:
+            stat = os.stat(self.excel_path)
+            sha256 = sha256 or self._excel_sha256()
+            cache = {
+                'version': PORT_REGISTRY_CACHE_VERSION,
+                'source': {
+                    'size': stat.st_size,
+                    'sha256': sha256
+                },
+                'ports': [[code, info] for code, info in ports]
+            }
+            tmp_path = f"{cache_path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(cache, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp_path, cache_path)
+            self._write_port_registry_stamp(stat.st_mtime_ns, sha256)
+        except Exception as e:
+            print(f"⚠️ 港口清單快取寫入失敗: {e}")
+
+    def _read_port_registry_stamp(self) -> Optional[List[Any]]:
+        """
+        讀取 stamp 檔
+        
+        Returns:
+            [Excel 修改時間 (ns), Excel 雜湊]，不存在或無法讀取時為 None
+        """
+        try:
+            with open(self.port_registry_stamp_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_port_registry_stamp(self, mtime_ns: int, sha256: str) -> None:
+        """
+        記錄雜湊已確認過的 Excel 修改時間（寫入失敗只是下次需要重新計算雜湊）
+        
+        Args:
+            mtime_ns: Excel 修改時間
+            sha256: Excel 雜湊
+        """
+        try:
+            with open(self.port_registry_stamp_path, 'w', encoding='utf-8') as f:
+                json.dump([mtime_ns, sha256], f)
+        except OSError as e:
+            print(f"⚠️ 港口清單快取 stamp 寫入失敗: {e}")
+
+    def get_all_ports_display(self) -> List[str]:
+        """
+        回傳給 UI 下拉選單用的清單
+        
+        Returns:
+            List[str]: 港口代碼和名稱的列表
+        """
+        if not self.port_map:
+            return []
+        return [f"{code} - {info['name']}" for code, info in self.port_map.items()]
+
+    def parse_issued_time(self, content: str) -> str:
+        """
+        從氣象內容中解析發布時間
+        
+        Args:
+            content: 氣象內容
+            
+        Returns:
+            str: 發布時間字串
+        """
+        for line in content.splitlines():
+            issued_time = self._issued_time_from_line(line)
+            if issued_time:
+                return issued_time
+        return datetime.now().strftime("%Y%m%d%H%M")
+
+    @staticmethod
+    def _issued_time_from_line(line: str) -> Optional[str]:
+        """
+        解析 "ISSUED AT: 20251226 0600 UTC" 這一行
+        
+        Args:
+            line: 氣象內容的一行
+            
+        Returns:
+            發布時間字串（如 20251226_0600），不是發布時間行時返回 None
+        """
+        if line.strip().startswith("ISSUED AT:"):
+            return line.split(":", 1)[1].strip().replace(" UTC", "").replace(" ", "_")
+        return None
+
+    def _known_issued_time(self, whl_port_codes: List[str]) -> Optional[str]:
+        """
+        取得同一站點所有港口在資料庫中共同的最新發布時間
+        
+        Args:
+            whl_port_codes: 共用同一站點 ID 的港口代碼列表
+            
+        Returns:
+            發布時間字串；任一港口沒有資料或各港口不一致時返回 None
+        """
+        times = {self.db.get_latest_time(code) for code in whl_port_codes}
+        return times.pop() if len(times) == 1 else None
+
+    @classmethod
+    def _scan_header(cls, buffered: bytes, known_issued: str) -> Optional[bool]:
+        """
+        在已讀到的開頭內容中尋找發布時間
+        
+        Args:
+            buffered: 目前讀到的內容
+            known_issued: 資料庫中的發布時間
+            
+        Returns:
+            True: 發布時間與資料庫相同；False: 不同（或開頭找不到，不再檢查）；None: 還需要再讀
+        """
+        # 最後一行可能還沒讀完整，只看完整的行
+        complete, _, _ = buffered.rpartition(b"\n")
+        for line in complete.decode("utf-8", errors="replace").splitlines():
+            issued_time = cls._issued_time_from_line(line)
+            if issued_time:
+                return issued_time == known_issued
+        return False if len(buffered) >= STREAM_HEADER_BYTES else None
+
+    def _read_bulletin(self, response: requests.Response,
+                       known_issued: Optional[str]) -> Tuple[Optional[str], int]:
+        """
+        逐塊讀取串流回應：開頭的發布時間與資料庫相同時中止下載
+        
+        Args:
+            response: stream=True 的回應
+            known_issued: 資料庫中的發布時間（None 表示一定要讀完）
+            
+        Returns:
+            Tuple[氣象內容（發布時間未變而中止下載時為 None）, 讀取的位元組數]
+        """
+        chunks = []
+        received = 0
+        checking = known_issued is not None
+        for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+            chunks.append(chunk)
+            received += len(chunk)
+            if not checking:
+                continue
+            unchanged = self._scan_header(b"".join(chunks), known_issued)
+            if unchanged is None:
+                continue
+            if not unchanged:
+                checking = False
+                continue
+            
+            remaining = int(response.headers.get("Content-Length") or 0) - received
+            if 0 <= remaining <= STREAM_DRAIN_MAX_BYTES:
+                for chunk in response.iter_content(chunk_size=STREAM_DRAIN_MAX_BYTES):
+                    received += len(chunk)
+            else:
+                response.close()
+            return None, received
+        return b"".join(chunks).decode(response.encoding or "utf-8", errors="replace"), received
+
+    @staticmethod
+    def _port_url(p_info: Dict[str, Any]) -> str:
+        """
+        組出港口 48 小時預報的下載網址
+        
+        Args:
+            p_info: port_map 中的港口資訊
+            
+        Returns:
+            str: 下載網址
+        """
+        return f"{AEDYN_BASE_URL}/api/business/sea/portstatus/content/48h/{p_info['id']}.txt"
+
+    def _store_content(self, whl_port_codes: List[str], content: str,
+                       response_headers: Optional[Any] = None) -> Dict[str, Tuple[bool, str]]:
+        """
+        解析發布時間並將下載內容寫入共用同一站點的所有港口（已是最新則略過）
+        
+        發布時間與逐時預報只解析一次；批次下載期間資料會交給寫入緩衝區，由單一執行緒批次寫入。
+        
+        Args:
+            whl_port_codes: 共用同一站點 ID 的港口代碼列表
+            content: 下載的氣象內容
+            response_headers: 回應的 Headers（用來記錄 ETag / Last-Modified）
+            
+        Returns:
+            Dict[str, Tuple[bool, str]]: 各港口代碼的 (成功與否, 訊息)
+        """
+        issued_time = self.parse_issued_time(content)
+        results: Dict[str, Tuple[bool, str]] = {}
+        rows = []
+        forecast = None
+
+        for whl_port_code in whl_port_codes:
+            if self.db.get_latest_time(whl_port_code) == issued_time:
+                results[whl_port_code] = (True, f"天氣資料已是最新 ({issued_time})")
+                continue
+            
+            if forecast is None:
+                forecast = self._parse_forecast_rows(content, issued_time)
+            p_info = self.port_map[whl_port_code]
+            row = {
+                'port_name': p_info['name'],
+                'wni_port_code': p_info['wni_code'],
+                'whl_port_code': whl_port_code,
+                'country': p_info['country'],
+                'station_id': p_info['id'],
+                'issued_time': issued_time,
+                'content': content,
+                'forecast': forecast,
+            }
+            if response_headers is not None:
+                # 驗證資訊與內容在同一交易寫入，避免內容寫入失敗卻在下次收到 304
+                row['etag'] = response_headers.get("ETag")
+                row['last_modified'] = response_headers.get("Last-Modified")
+            rows.append(row)
+        
+        if not rows:
+            if response_headers is not None:
+                self._remember_validators(whl_port_codes[0], response_headers)
+            return results
+        
+        writer = self._writer
+        if writer is not None:
+            for row in rows:
+                writer.put(row)
+            saved = True
+        else:
+            saved = self.db.save_weather_batch(rows)
+        
+        for row in rows:
+            results[row['whl_port_code']] = (True, f"更新成功 ({issued_time})") if saved else (False, "資料庫寫入失敗")
+        return results
+
+    def _parse_forecast_rows(self, content: str, issued_time: str) -> List[Dict[str, Any]]:
+        """
+        在寫入前解析逐時預報，讓分析階段不必再解析原始文字
+        
+        Args:
+            content: 氣象內容
+            issued_time: 發布時間
+            
+        Returns:
+            List[Dict]: forecast_records 資料列（解析失敗時為空列表）
+        """
+        year = int(issued_time[:4]) if issued_time[:4].isdigit() else None
+        try:
+            _, records, _ = self.parser.parse_content(content, year=year)
+        except ValueError:
+            return []
+        weather = self.parser.parse_weather_section(content)
+        
+        rows = []
+        for record in records:
+            wx = weather.get(record.utc_time.strftime("%m%d %H%M"), {})
+            rows.append({
+                'valid_time': record.utc_time.strftime("%Y-%m-%d %H:%M"),
+                'local_time': record.time.strftime("%Y-%m-%d %H:%M"),
+                'wind_dir': record.wind_direction,
+                'wind_speed_kts': record.wind_speed_kts,
+                'wind_gust_kts': record.wind_gust_kts,
+                'wave_dir': record.wave_direction,
+                'wave_sig_m': record.wave_height,
+                'wave_max_m': record.wave_max,
+                'wave_period_s': record.wave_period,
+                'temp_c': wx.get('temp_c'),
+                'precip_mmh': wx.get('precip_mmh'),
+                'pressure_hpa': wx.get('pressure_hpa'),
+                'visibility': wx.get('visibility'),
+                'weather': wx.get('weather'),
+                'sds': wx.get('sds'),
+            })
+        return rows
+
+    def _start_writer(self) -> None:
+        """批次下載開始時啟用寫入緩衝區"""
+        self._writer = WeatherWriteBuffer(self.db)
+
+    def _finish_writer(self, stats: Dict[str, int]) -> None:
+        """
+        批次下載結束時寫入剩餘資料，並把寫入失敗的港口改計為失敗
+        
+        Args:
+            stats: 統計結果字典
+        """
+        writer, self._writer = self._writer, None
+        if writer is None:
+            return
+        writer.close()
+        if writer.failed_ports:
+            print(f"❌ 資料庫批次寫入失敗: {', '.join(writer.failed_ports)}")
+            stats['success'] -= len(writer.failed_ports)
+            stats['fail'] += len(writer.failed_ports)
+
+    def _request_headers(self, whl_port_codes: List[str]) -> Dict[str, str]:
+        """
+        組出下載用的 Headers，若已有快取資料則附上條件式請求標頭
+        
+        Args:
+            whl_port_codes: 共用同一站點 ID 的港口代碼列表
+            
+        Returns:
+            dict: HTTP Headers
+        """
+        headers = dict(self.headers)
+        
+        # 任一港口在資料庫沒有資料時，不能讓 304 把它當成「已是最新」
+        if any(self.db.get_latest_time(code) is None for code in whl_port_codes):
+            return headers
+        
+        validators = self.db.get_validators(self.port_map[whl_port_codes[0]]['id'])
+        if validators:
+            etag, last_modified = validators
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+        return headers
+
+    def _remember_validators(self, whl_port_code: str, response_headers: Any) -> None:
+        """
+        記錄回應中的 ETag / Last-Modified，供下次條件式請求使用
+        
+        Args:
+            whl_port_code: 港口代碼
+            response_headers: 回應的 Headers
+        """
+        etag = response_headers.get("ETag")
+        last_modified = response_headers.get("Last-Modified")
+        if etag or last_modified:
+            self.db.save_validators(self.port_map[whl_port_code]['id'], etag, last_modified)
+
+    def fetch_port_data(self, whl_port_code: str, retry_login: bool = True) -> Tuple[bool, str]:
+        """
+        下載指定港口的氣象資料
+        
+        Args:
+            whl_port_code: 港口代碼
+            retry_login: 當遇到權限錯誤時是否自動重新登入
+            
+        Returns:
+            Tuple[bool, str]: (成功與否, 訊息)
+        """
+        if whl_port_code not in self.port_map:
+            return False, f"找不到港口代碼: {whl_port_code}"
+        return self.fetch_station_data([whl_port_code], retry_login)[whl_port_code]
+
+    def fetch_station_data(self, whl_port_codes: List[str], retry_login: bool = True) -> Dict[str, Tuple[bool, str]]:
+        """
+        下載一個 WNI 站點的氣象資料，並寫入共用此站點的所有港口代碼（量測結果記入 fetch_metrics）
+        
+        Args:
+            whl_port_codes: 共用同一站點 ID 的港口代碼列表（見 group_by_station）
+            retry_login: 當遇到權限錯誤時是否自動重新登入
+            
+        Returns:
+            Dict[str, Tuple[bool, str]]: 各港口代碼的 (成功與否, 訊息)
+        """
+        sample = self._new_sample(whl_port_codes)
+        started = time.perf_counter()
+        results = self._fetch_station(whl_port_codes, retry_login, sample)
+        self._finish_sample(sample, started, results)
+        return results
+
+    def _new_sample(self, whl_port_codes: List[str]) -> Dict[str, Any]:
+        """
+        建立一個站點請求的量測紀錄（欄位見 FetchMetrics.record）
+        
+        Args:
+            whl_port_codes: 共用同一站點 ID 的港口代碼列表
+        """
+        sample: Dict[str, Any] = dict.fromkeys(FetchMetrics.PHASES)
+        sample.update(station=self.port_map[whl_port_codes[0]]['id'], ports=list(whl_port_codes),
+                      status=None, retries=0, bytes=0, result=None)
+        return sample
+
+    def _finish_sample(self, sample: Dict[str, Any], started: float,
+                       results: Dict[str, Tuple[bool, str]]) -> None:
+        """
+        補上總耗時、排隊等待時間與結果並記入 fetch_metrics
+        
+        Args:
+            sample: 量測紀錄
+            started: 開始處理的時間（time.perf_counter）
+            results: 各港口代碼的結果
+        """
+        total_ms = (time.perf_counter() - started) * 1000
+        sample['total_ms'] = round(total_ms, 1)
+        if sample['status'] is not None:
+            # 總耗時扣掉網路各階段，剩下的是限速、斷路器、重試退避與寫入等待
+            network_ms = sum(sample[phase] or 0 for phase in ('dns_ms', 'connect_ms', 'ttfb_ms', 'body_ms'))
+            sample['wait_ms'] = round(max(0.0, total_ms - network_ms), 1)
+        success, message = next(iter(results.values()))
+        sample['result'] = FetchMetrics.result_label(success, message)
+        self.fetch_metrics.record(sample)
+
+    def _fetch_station(self, whl_port_codes: List[str], retry_login: bool,
+                       sample: Dict[str, Any]) -> Dict[str, Tuple[bool, str]]:
+        """
+        fetch_station_data 的實作，過程中把各階段量測填入 sample
+        
+        Args:
+            whl_port_codes: 共用同一站點 ID 的港口代碼列表
+            retry_login: 當遇到權限錯誤時是否自動重新登入
+            sample: 量測紀錄
+            
+        Returns:
+            Dict[str, Tuple[bool, str]]: 各港口代碼的 (成功與否, 訊息)
+        """
+        if self._deadline.expired():
+            return self._mark_stale(whl_port_codes)
+
+        p_info = self.port_map[whl_port_codes[0]]
+        url = self._port_url(p_info)
+        
+        print(f"📡 正在下載 {', '.join(whl_port_codes)} ({p_info['name']})...")
+        
+        def same(result: Tuple[bool, str]) -> Dict[str, Tuple[bool, str]]:
+            return {code: result for code in whl_port_codes}
+        
+        try:
+            generation = self._auth_generation
+            known_issued = self._known_issued_time(whl_port_codes)
+            response, sample['retries'] = self._limited_get(url, self._request_headers(whl_port_codes))
+            if response is None:
+                return same((False, BREAKER_OPEN_MESSAGE))
+            
+            sample['status'] = response.status_code
+            sample['connect_ms'] = response.connect_elapsed
+            # elapsed 是送出請求到收到回應標頭（含建立連線），扣掉連線時間就是 TTFB
+            sample['ttfb_ms'] = round(response.elapsed.total_seconds() * 1000 - (response.connect_elapsed or 0), 1)
+            
+            # 串流回應：用完就釋放連線
+            with response:
+                if response.status_code == 200:
+                    read_start = time.perf_counter()
+                    content, sample['bytes'] = self._read_bulletin(response, known_issued)
+                    sample['body_ms'] = round((time.perf_counter() - read_start) * 1000, 1)
+                    if content is None:
+                        self._remember_validators(whl_port_codes[0], response.headers)
+                        return same((True, f"天氣資料已是最新 ({known_issued}，讀到發布時間即中止下載)"))
+                    return self._store_content(whl_port_codes, content, response.headers)
+                
+                elif response.status_code == 304:
+                    return same((True, "天氣資料已是最新 (HTTP 304)"))
+                
+                elif response.status_code in [401, 403]:
+                    # Cookie 過期，嘗試重新登入（其他執行緒已在登入時會等它完成並沿用結果）
+                    if retry_login:
+                        if self._refresh_after_auth_error(generation):
+                            # 重新嘗試下載（但不再重試登入，避免無限迴圈）
+                            return self.fetch_station_data(whl_port_codes, retry_login=False)
+                    return same((False, f"權限不足 (HTTP {response.status_code}) - Cookie 已過期"))
+                else:
+                    return same((False, f"下載失敗 (HTTP {response.status_code})"))
+                
+        except DeadlineExceeded:
+            return self._mark_stale(whl_port_codes)
+        except requests.exceptions.RequestException as e:
+            # 時間預算用完後的請求錯誤（逾時被縮短、連線重試中斷）都視為來不及下載
+            if self._deadline.expired():
+                return self._mark_stale(whl_port_codes)
+            if isinstance(e, requests.exceptions.Timeout):
+                return same((False, f"連線逾時（超過 {TIMEOUT} 秒）"))
+            return same((False, f"連線錯誤: {str(e)}"))
+        except Exception as e:
+            return same((False, f"連線錯誤: {str(e)}"))
+
+    def _record_api_status(self, status: int, response_headers: Any) -> Optional[float]:
+        """
+        將回應狀態回饋給限速器與斷路器
+        
+        Args:
+            status: HTTP 狀態碼
+            response_headers: 回應的 Headers
+            
+        Returns:
+            float: 需要重試時返回重試前的等待秒數，不需重試返回 None
+        """
+        if status not in RETRY_STATUS:
+            self.rate_limiter.on_success()
+            self.breaker.record_success()
+            return None
+        
+        retry_after = _parse_retry_after(response_headers.get('Retry-After'))
+        self.rate_limiter.on_throttle(retry_after)
+        if status == 429:
+            # 429 代表 API 正常但要求降速：不算故障，half_open 的試探也因此成功
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+        # 429 與 Retry-After 已由限速器降速 / 擋住後續請求，不必另外等待；5xx 才指數退避
+        return 0.0 if retry_after or status == 429 else 1.0
+
+    def _breaker_wait(self) -> Optional[float]:
+        """
+        斷路器放行前還要等幾秒（在時間預算內）
+        
+        Returns:
+            float: 等待秒數（0 表示可立即呼叫 allow）；斷路器已放棄等待時返回 None
+            （等待會超過時間預算時拋出 DeadlineExceeded）
+        """
+        wait = self.breaker.wait_time()
+        if wait is not None and wait > 0 and wait >= self._deadline.remaining():
+            raise DeadlineExceeded()
+        return wait
+
+    def _wait_for_breaker(self) -> Union[bool, str]:
+        """
+        等斷路器冷卻結束並放行（冷卻後由第一個請求試探，其他請求等待試探結果）
+        
+        Returns:
+            CircuitBreaker.allow 的放行結果（True 或 PROBE）；試探已連續失敗太多次返回 False
+        """
+        grant = self.breaker.allow()
+        while not grant:
+            wait = self._breaker_wait()
+            if wait is None:
+                return False
+            time.sleep(wait)
+            grant = self.breaker.allow()
+        return grant
+
+    def _limited_get(self, url: str, headers: Dict[str, str]) -> Tuple[Optional[requests.Response], int]:
+        """
+        經過斷路器與限速器送出 GET，429/5xx 時降速後重試（串流回應，內容由呼叫端讀取並關閉）
+        
+        Args:
+            url: 請求網址
+            headers: HTTP Headers
+            
+        Returns:
+            Tuple[最後一次的回應（斷路器放棄等待時為 None）, 重試次數]
+            （等待斷路器或限速會超過時間預算時拋出 DeadlineExceeded）
+        """
+        for attempt in range(MAX_RETRIES + 1):
+            grant = self._wait_for_breaker()
+            if not grant:
+                return None, attempt
+            try:
+                if not self.rate_limiter.acquire(self._deadline):
+                    raise DeadlineExceeded()
+                try:
+                    response = self._send_get(url, headers)
+                except requests.exceptions.RequestException:
+                    # 因時間預算縮短逾時而中斷的請求不代表 API 故障
+                    if not self._deadline.expired():
+                        self.breaker.record_failure()
+                    raise
+                backoff = self._record_api_status(response.status_code, response.headers)
+            except BaseException:
+                # 試探請求沒有記錄結果就結束時釋放試探名額，否則其他請求會一直等下去
+                if grant == CircuitBreaker.PROBE:
+                    self.breaker.release_probe()
+                raise
+            
+            if backoff is None or attempt == MAX_RETRIES or self._deadline.expired():
+                return response, attempt
+            response.close()
+            time.sleep(min(backoff * 2 ** attempt, self._deadline.remaining()))
+
+    def _timed_get(self, url: str, headers: Dict[str, str], use_slot: bool = True) -> requests.Response:
+        """
+        在主機併發限制內送出 GET，並記錄成功回應的耗時（收到回應標頭為止）
+        
+        Args:
+            url: 請求網址
+            headers: HTTP Headers
+            use_slot: 是否在此等待主機併發名額（hedging 的備援請求由 _send_get 以非阻塞方式先取得）
+            
+        Returns:
+            requests.Response: 串流回應（內容尚未讀取）
+        """
+        start = time.perf_counter()
+        _connect_timing.seconds = None
+        if use_slot:
+            with self._host_slot(url):
+                response = self.session.get(url, headers=headers, verify=False, timeout=self._request_timeout(),
+                                            stream=True)
+        else:
+            response = self.session.get(url, headers=headers, verify=False, timeout=self._request_timeout(),
+                                        stream=True)
+        # 這次請求新建連線的耗時（毫秒，沿用既有連線時為 None），與 response.elapsed 一起供量測使用
+        connect = _connect_timing.seconds
+        response.connect_elapsed = round(connect * 1000, 1) if connect is not None else None
+        if response.status_code in (200, 304):
+            self.latency.record(time.perf_counter() - start)
+        return response
+
+    def _send_get(self, url: str, headers: Dict[str, str]) -> requests.Response:
+        """
+        送出 GET；啟用 hedging 時若超過等待門檻仍未回應，再送一份相同請求，先成功回來的勝出
+        
+        Args:
+            url: 請求網址
+            headers: HTTP Headers
+            
+        Returns:
+            requests.Response: 先完成的回應
+        """
+        delay = self.latency.hedge_delay() if self._hedge_pool is not None else None
+        if delay is None:
+            return self._timed_get(url, headers)
+        
+        primary = self._hedge_pool.submit(self._timed_get, url, headers)
+        try:
+            return primary.result(timeout=delay)
+        except FutureTimeoutError:
+            pass
+        
+        # 備援請求同樣受時間預算、限速器與主機併發上限約束；沒有空的名額就不送，繼續等主要請求
+        if self._deadline.expired() or not self.rate_limiter.acquire(self._deadline):
+            return primary.result()
+        slot = self._host_slot(url)
+        if not slot.acquire(blocking=False):
+            return primary.result()
+        backup = self._hedge_pool.submit(self._backup_get, url, headers, slot)
+        self._count_hedge('fired')
+        
+        # 先完成且沒有錯誤的勝出；落後的請求無法中止，讓它在背景結束後關閉回應
+        pending = {primary, backup}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is backup:
+                        self._count_hedge('won')
+                    for loser in pending:
+                        loser.add_done_callback(_close_response)
+                    return future.result()
+        return primary.result()
+
+    def _backup_get(self, url: str, headers: Dict[str, str], slot: threading.BoundedSemaphore) -> requests.Response:
+        """
+        送出 hedging 的備援請求，完成後釋放呼叫端已取得的主機併發名額
+        
+        Args:
+            url: 請求網址
+            headers: HTTP Headers
+            slot: 已取得的主機併發名額
+            
+        Returns:
+            requests.Response: 串流回應（內容尚未讀取）
+        """
+        try:
+            return self._timed_get(url, headers, use_slot=False)
+        finally:
+            slot.release()
+
+    def _count_hedge(self, key: str) -> None:
+        """累計 hedging 次數（fired: 送出備援請求，won: 備援請求先回來）"""
+        with self._hedge_lock:
+            self.hedge_stats[key] += 1
+
+    def _begin_deadline(self, deadline: Optional[Deadline]) -> None:
+        """
+        批次開始：套用時間預算並清空 stale_ports
+        
+        Args:
+            deadline: 時間預算（None 表示不限制）
+        """
+        self._deadline = deadline or Deadline()
+        self.stale_ports = []
+        if self._deadline.seconds:
+            print(f"⏱️ 下載階段時間預算: {self._deadline.remaining():.0f} 秒")
 
-    def _create_session(self) -> requests.Session:
+    def _begin_hedging(self, hedge: bool) -> None:
         """
-        建立 requests session 並設定重試機制
+        批次開始：重設回應時間統計與 hedging 次數
         
-        Returns:
-            requests.Session: 設定好的 session
+        Args:
+            hedge: 本次批次是否啟用 hedging
         """
-        session = requests.Session()
-        retry = Retry(
-            total=MAX_RETRIES,
-            backoff_factor=1,
-            status_forcelist=[429, 500, 502, 503, 504]
-        )
-        adapter = HTTPAdapter(max_retries=retry)
-        session.mount("https://", adapter)
-        return session
+        self.latency = LatencyTracker()
+        self.hedge_stats = {'fired': 0, 'won': 0}
+        self._hedging = hedge
 
-    def refresh_cookies(self, headless: bool = True) -> bool:
+    def _end_hedging(self, stats: Dict[str, int]) -> None:
         """
-        重新登入並更新 Cookie 和 JWT Token
+        批次結束：把 hedging 次數寫入統計結果
         
         Args:
-            headless: 是否使用無頭模式
-            
-        Returns:
-            bool: 更新成功返回 True
+            stats: 統計結果
         """
-        try:
-            print("\n🔄 正在更新 Cookie 和 JWT Token...")
-            result = self.login_manager.login_and_get_cookies(headless=headless)
-            self.headers = self.login_manager.get_headers()
-            
-            print("\n📋 取得的 Headers:")
-            print(f"   Cookie 數量: {len(result['cookies'])}")
-            print(f"   JWT Token: {'✅ 已取得' if result['jwt_token'] else '❌ 未取得'}")
-            
-            # 顯示部分 Cookie 名稱
-            if result['cookies']:
-                cookie_names = list(result['cookies'].keys())[:5]
-                print(f"   Cookie 範例: {', '.join(cookie_names)}...")
-            
-            print("✅ Headers 已更新\n")
-            return True
-        except Exception as e:
-            print(f"❌ Cookie 更新失敗: {e}")
-            return False
+        if self._hedging:
+            stats['hedged'] = self.hedge_stats['fired']
+            stats['hedge_won'] = self.hedge_stats['won']
+        self._hedging = False
 
-    def _load_port_map(self) -> None:
-        """一次性讀取 Excel 並載入所有港口資訊（含經緯度）"""
-        if not os.path.exists(self.excel_path):
-            print(f"⚠️ 找不到 {self.excel_path}，請確認檔案位置。")
-            return
+    def api_health(self) -> Dict[str, Any]:
+        """
+        限速器與斷路器的狀態，以及上一次批次下載實際達到的請求速率
+        
+        Returns:
+            dict: {'rate_limiter': {...}, 'circuit_breaker': {...}, 'effective_rate': 請求/秒}
+        """
+        limiter = self.rate_limiter.snapshot()
+        run_requests = limiter['requests'] - self._run_requests_start
+        return {
+            'rate_limiter': limiter,
+            'circuit_breaker': self.breaker.snapshot(),
+            'effective_rate': round(run_requests / self._last_run_seconds, 2) if self._last_run_seconds else 0.0
+        }
 
-        try:
-            print("⏳ 正在載入港口資料...")
-            df = pd.read_excel(self.excel_path, sheet_name='all_ports_list')
-            
-            # 清理欄位名稱（去除前後空格）
-            df.columns = df.columns.str.strip()
-            
-            for _, row in df.iterrows():
-                code = str(row['Port_Code_5']).strip()
-                obj_id = str(row['Station ID (Object_ID)']).strip()
-                
-                if code and obj_id and obj_id != 'nan':
-                    # 處理經緯度：先轉為 float，若為 NaN 則設為 0.0
-                    try:
-                        lat = float(row.get('Lat', 0.0))
-                        lat = 0.0 if np.isnan(lat) else lat
-                    except (ValueError, TypeError):
-                        lat = 0.0
-                        
-                    try:
-                        lon = float(row.get('Lon', 0.0))
-                        lon = 0.0 if np.isnan(lon) else lon
-                    except (ValueError, TypeError):
-                        lon = 0.0
-
-                    self.port_map[code] = {
-                        'id': obj_id,
-                        'name': str(row['Port Name']).strip(),
-                        'wni_code': str(row.get('WNI Port Code', code)).strip(),
-                        'country': str(row.get('Country', 'N/A')),
-                        'latitude': lat,
-                        'longitude': lon
-                    }
-                    self.port_list.append(code)
-            
-            print(f"✅ 已載入 {len(self.port_map)} 個港口資料")
-            
-        except Exception as e:
-            print(f"❌ 讀取 Excel 失敗: {e}")
-            import traceback
-            traceback.print_exc()
+    def _print_run_summary(self, stats: Dict[str, int]) -> None:
+        """輸出批次下載統計"""
+        health = self.api_health()
+        print(f"\n📊 下載完成！")
+        print(f"   ✅ 成功: {stats['success']}")
+        print(f"   ⏭️  略過: {stats['skip']}（其中免請求: {stats['avoided']}）")
+        if stats.get('resumed'):
+            print(f"   ♻️  接續: {stats['resumed']} 個港口已在中斷前完成（已計入略過）")
+        print(f"   ❌ 失敗: {stats['fail']}")
+        print(f"   📦 站點下載: {stats['unique_downloads']} 次（同站點分送給其他港口代碼: {stats['fanout_writes']} 次）")
+        if stats.get('stale'):
+            print(f"   ⏳ 超過時間預算未更新: {stats['stale']}（沿用舊資料）")
+        if 'hedged' in stats:
+            print(f"   🏇 Hedging: 送出備援請求 {stats['hedged']} 次，其中 {stats['hedge_won']} 次先回應")
+        latency = self.fetch_metrics.summary()['latency_ms']
+        if 'total_ms' in latency:
+            total, ttfb = latency['total_ms'], latency.get('ttfb_ms', {})
+            print(f"   ⏱️  請求耗時 p50/p95: {total['p50']}/{total['p95']} ms"
+                  f"（TTFB {ttfb.get('p50')}/{ttfb.get('p95')} ms）")
+        print(f"   🚦 實際速率: {health['effective_rate']} 請求/秒（限速 {health['rate_limiter']['rate']}，"
+              f"節流 {health['rate_limiter']['throttled']} 次），斷路器: {health['circuit_breaker']['state']}")
 
-    def get_all_ports_display(self) -> List[str]:
+    def group_by_station(self, whl_port_codes: List[str]) -> List[List[str]]:
         """
-        回傳給 UI 下拉選單用的清單
+        將港口代碼依 WNI 站點 ID 分組（維持原本順序），同一站點每次執行只需下載一次
         
+        Args:
+            whl_port_codes: 港口代碼列表
+            
         Returns:
-            List[str]: 港口代碼和名稱的列表
+            List[List[str]]: 各站點的港口代碼列表（第一個為下載時的代表）
         """
-        if not self.port_map:
-            return []
-        return [f"{code} - {info['name']}" for code, info in self.port_map.items()]
+        groups: Dict[str, List[str]] = {}
+        for code in whl_port_codes:
+            groups.setdefault(str(self.port_map[code]['id']), []).append(code)
+        return list(groups.values())
 
-    def parse_issued_time(self, content: str) -> str:
+    def _plan_ports(self, use_schedule: bool, resume: bool = False) -> Tuple[List[str], Dict[str, int]]:
         """
-        從氣象內容中解析發布時間
+        決定本次需要下載的港口並開始（或接續）下載日誌，預先計入略過的港口
         
         Args:
-            content: 氣象內容
+            use_schedule: 是否略過下一次發布尚未到期的港口
+            resume: 是否接續上一次中斷的批次下載（略過其中已完成的港口）
             
         Returns:
-            str: 發布時間字串
+            Tuple[需要下載的港口代碼列表, 初始統計結果]
         """
-        for line in content.splitlines():
-            if line.strip().startswith("ISSUED AT:"):
-                return line.split(":", 1)[1].strip().replace(" UTC", "").replace(" ", "_")
-        return datetime.now().strftime("%Y%m%d%H%M")
+        stats = {'success': 0, 'skip': 0, 'fail': 0, 'avoided': 0, 'stale': 0, 'resumed': 0,
+                 'unique_downloads': 0, 'fanout_writes': 0}
+        pending = list(self.port_list)
+        
+        self.run_id = self.db.find_resumable_run() if resume else None
+        if self.run_id:
+            completed = self.db.get_completed_ports(self.run_id)
+            pending = [code for code in pending if code not in completed]
+            stats['resumed'] = len(self.port_list) - len(pending)
+            stats['skip'] += stats['resumed']
+            print(f"♻️  接續中斷的批次下載 {self.run_id}：略過 {stats['resumed']} 個已完成的港口")
+        else:
+            if resume:
+                print("♻️  沒有可接續的批次下載，重新開始")
+            self.run_id = self.db.start_crawl_run()
+        
+        if not use_schedule:
+            return self._prioritize(pending), stats
+        
+        self.scheduler.learn()
+        due = [code for code in pending if self.scheduler.is_due(code)]
+        
+        stats['avoided'] = len(pending) - len(due)
+        stats['skip'] += stats['avoided']
+        if stats['avoided']:
+            print(f"⏭️  依發布週期略過 {stats['avoided']} 個下一次發布尚未到期的港口（免發送請求）")
+        return self._prioritize(due), stats
 
-    def fetch_port_data(self, whl_port_code: str, retry_login: bool = True) -> Tuple[bool, str]:
+    def _prioritize(self, whl_port_codes: List[str]) -> List[str]:
         """
-        下載指定港口的氣象資料
+        依上次評估的風險等級（高到低）與資料新舊（舊到新、沒有資料的最先）排序下載順序，
+        並記下本次要下載的風險港口
         
         Args:
-            whl_port_code: 港口代碼
-            retry_login: 當遇到權限錯誤時是否自動重新登入
+            whl_port_codes: 本次要下載的港口代碼
             
         Returns:
-            Tuple[bool, str]: (成功與否, 訊息)
+            List[str]: 排序後的港口代碼
         """
-        if whl_port_code not in self.port_map:
-            return False, f"找不到港口代碼: {whl_port_code}"
+        risk_levels = self.db.get_risk_levels()
+        latest = self.db.get_issued_history(limit_per_port=1)
+        ordered = sorted(
+            whl_port_codes,
+            key=lambda code: (-risk_levels.get(code, 0), latest.get(code, [''])[0])
+        )
+        
+        self.priority_ports = [code for code in ordered if risk_levels.get(code, 0) > 0]
+        self._priority_pending = set(self.priority_ports)
+        if self.priority_ports:
+            print(f"🎯 優先下載上次評估有風險的 {len(self.priority_ports)} 個港口")
+        return ordered
 
-        p_info = self.port_map[whl_port_code]
-        url = f"https://aedyn.weathernews.com/api/business/sea/portstatus/content/48h/{p_info['id']}.txt"
+    def _check_priority_done(self, whl_port_codes: Iterable[str]) -> None:
+        """
+        上次有風險的港口全部有結果時，寫入資料庫並呼叫 on_priority_done（每次執行只呼叫一次）
         
-        print(f"📡 正在下載 {whl_port_code} ({p_info['name']})...")
+        Args:
+            whl_port_codes: 剛取得結果的港口代碼
+        """
+        if not self._priority_ready(whl_port_codes):
+            return
+        if self._writer is not None:
+            self._writer.flush()
+        self._notify_priority_done()
+
+    def _priority_ready(self, whl_port_codes: Iterable[str]) -> bool:
+        """
+        記下剛取得結果的港口，判斷是否該呼叫 on_priority_done
         
-        try:
-            response = self.session.get(url, headers=self.headers, verify=False, timeout=TIMEOUT)
+        Args:
+            whl_port_codes: 剛取得結果的港口代碼
             
-            if response.status_code == 200:
-                content = response.text
-                issued_time = self.parse_issued_time(content)
-                cached_time = self.db.get_latest_time(whl_port_code)
+        Returns:
+            bool: 上次有風險的港口剛好全部有結果（且有設定 on_priority_done）時返回 True
+        """
+        if not self._priority_pending:
+            return False
+        self._priority_pending.difference_update(whl_port_codes)
+        return not self._priority_pending and self._on_priority_done is not None
 
-                if cached_time == issued_time:
-                    return True, f"天氣資料已是最新 ({issued_time})"
-                
-                if self.db.save_weather(
-                    p_info['wni_code'], whl_port_code, p_info['name'], 
-                    p_info['id'], p_info['country'], issued_time, content
-                ):
-                    return True, f"更新成功 ({issued_time})"
-                else:
-                    return False, "資料庫寫入失敗"
-                    
-            elif response.status_code in [401, 403]:
-                # Cookie 過期，嘗試重新登入
-                if retry_login:
-                    print("⚠️ Cookie 已過期，正在重新登入...")
-                    if self.refresh_cookies():
-                        # 重新嘗試下載（但不再重試登入，避免無限迴圈）
-                        return self.fetch_port_data(whl_port_code, retry_login=False)
-                return False, f"權限不足 (HTTP {response.status_code}) - Cookie 已過期"
-            else:
-                return False, f"下載失敗 (HTTP {response.status_code})"
-                
-        except requests.exceptions.Timeout:
-            return False, f"連線逾時（超過 {TIMEOUT} 秒）"
+    def _notify_priority_done(self) -> None:
+        """呼叫 on_priority_done（呼叫前需已將這些港口的資料寫入資料庫）"""
+        try:
+            self._on_priority_done(list(self.priority_ports))
         except Exception as e:
-            return False, f"連線錯誤: {str(e)}"
+            print(f"⚠️ on_priority_done 執行失敗: {e}")
 
-    def fetch_all_ports(self) -> Dict[str, int]:
+    def fetch_all_ports(self, max_workers: int = MAX_WORKERS, use_schedule: bool = True,
+                        hedge: bool = False, deadline: Optional[Deadline] = None,
+                        resume: bool = False,
+                        on_priority_done: Optional[Callable[[List[str]], None]] = None) -> Dict[str, int]:
         """
         批次下載所有港口資料
         
+        上次評估有風險的港口最先下載（其次是資料最舊的港口）。每個港口的結果會在資料寫入後
+        記入下載日誌（crawl_journal），中途中斷時可用 resume 接續。
+        
+        Args:
+            max_workers: 同時下載的工作執行緒數（1 表示逐一下載）
+            use_schedule: 是否略過下一次發布尚未到期的港口
+            hedge: 回應慢於本次批次 HEDGE_PERCENTILE 百分位數時是否再送一份請求
+            deadline: 時間預算（逾時隨剩餘時間縮短，用完後其餘港口記入 stale_ports）
+            resume: 是否接續 CRAWL_RESUME_WINDOW_MINUTES 分鐘內中斷的批次下載
+            on_priority_done: 上次有風險的港口全部下載完成（並已寫入資料庫）時呼叫，
+                              參數為這些港口代碼；在下載迴圈中執行，耗時的工作應交給其他執行緒
+        
         Returns:
-            Dict[str, int]: 統計結果 {'success': n, 'skip': n, 'fail': n}
+            Dict[str, int]: 統計結果 {'success': n, 'skip': n, 'fail': n, 'avoided': n, 'stale': n,
+                            'unique_downloads': n, 'fanout_writes': n}
+                            （success / skip / fail 以港口代碼計；avoided 為依發布週期免發送請求的港口數，已計入 skip；
+                            stale 為超過時間預算未更新的港口數；resumed 為接續時已完成而略過的港口數，已計入 skip；
+                            unique_downloads 為實際下載內容並寫入資料的站點數，
+                            fanout_writes 為同一次下載另外寫入的港口代碼數；啟用 hedge 時另有 hedged / hedge_won）
         """
-        print(f"\n🚀 開始更新全部港口資訊，預計更新 {len(self.port_list)} 個港口資料...\n")
+        self._begin_deadline(deadline)
+        self._on_priority_done = on_priority_done
+        self.fetch_metrics = FetchMetrics()
+        self.breaker.rearm()
+        self._ensure_token_for_run()
+        pending, stats = self._plan_ports(use_schedule, resume)
+        stations = self.group_by_station(pending)
+        total = len(pending)
+        print(f"\n🚀 開始更新全部港口資訊，預計更新 {total} 個港口資料"
+              f"（{len(stations)} 個站點，併發數: {max_workers}）...\n")
         
-        success_count = 0
-        fail_count = 0
-        skip_count = 0
-        
-        for i, whl_port_code in enumerate(self.port_list, 1):
-            print(f"[{i}/{len(self.port_list)}] ", end="")
-            success, message = self.fetch_port_data(whl_port_code)
-            
-            if success:
-                if "已是最新" in message:
-                    skip_count += 1
-                else:
-                    success_count += 1
+        start_time = time.perf_counter()
+        self._run_requests_start = self.rate_limiter.requests
+        self._begin_hedging(hedge)
+        if hedge:
+            # 每個下載最多同時有主要與備援兩個請求
+            self._hedge_pool = ThreadPoolExecutor(max_workers=max(2, max_workers * 2))
+        self._start_writer()
+        done = 0
+        try:
+            if max_workers <= 1:
+                for whl_port_codes in stations:
+                    results = self.fetch_station_data(whl_port_codes)
+                    done = self._tally_station(stats, results, done, total)
             else:
-                fail_count += 1
-                
-            print(f"   {message}")
+                executor = ThreadPoolExecutor(max_workers=max_workers)
+                try:
+                    futures = {
+                        executor.submit(self.fetch_station_data, whl_port_codes): whl_port_codes
+                        for whl_port_codes in stations
+                    }
+                    for future in as_completed(futures):
+                        try:
+                            results = future.result()
+                        except Exception as e:
+                            results = {code: (False, f"連線錯誤: {str(e)}") for code in futures[future]}
+                        done = self._tally_station(stats, results, done, total)
+                except BaseException:
+                    # 中斷（Ctrl+C、例外）時取消尚未開始的站點，不等整個佇列跑完；
+                    # 已完成的港口在下方 finally 寫入資料庫與下載日誌，供 --resume 接續
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    raise
+                executor.shutdown()
+        finally:
+            if self._hedge_pool is not None:
+                self._hedge_pool.shutdown(wait=False)
+                self._hedge_pool = None
+            self._end_hedging(stats)
+            self._finish_writer(stats)
+            self._deadline = Deadline()
+            self._last_run_seconds = time.perf_counter() - start_time
         
-        print(f"\n📊 下載完成！")
-        print(f"   ✅ 成功: {success_count}")
-        print(f"   ⏭️  略過: {skip_count}")
-        print(f"   ❌ 失敗: {fail_count}")
+        # 只有完整跑完才結束日誌；中斷（例外、Ctrl+C）時留給下次接續
+        self.db.finish_crawl_run(self.run_id)
+        self._print_run_summary(stats)
+        return stats
+
+    @staticmethod
+    def _tally_result(stats: Dict[str, int], success: bool, message: str) -> None:
+        """
+        依下載結果累計統計數字
         
-        return {
-            'success': success_count,
-            'skip': skip_count,
-            'fail': fail_count
-        }
+        Args:
+            stats: 統計結果字典
+            success: 是否成功
+            message: 結果訊息
+        """
+        if success:
+            if "已是最新" in message:
+                stats['skip'] += 1
+            else:
+                stats['success'] += 1
+        elif message == STALE_MESSAGE:
+            stats['stale'] += 1
+        else:
+            stats['fail'] += 1
+
+    def _tally_station(self, stats: Dict[str, int], results: Dict[str, Tuple[bool, str]],
+                       done: int, total: int, check_priority: bool = True) -> int:
+        """
+        累計一個站點的下載結果、記入下載日誌並輸出進度
+        
+        Args:
+            stats: 統計結果字典
+            results: fetch_station_data 返回的各港口代碼結果
+            done: 目前已完成的港口數
+            total: 本次預計更新的港口數
+            check_priority: 是否順便檢查 on_priority_done（asyncio 版本自行處理，避免在事件迴圈中寫入資料庫）
+            
+        Returns:
+            int: 累計後已完成的港口數
+        """
+        written = 0
+        for whl_port_code, (success, message) in results.items():
+            self._tally_result(stats, success, message)
+            if self._writer is not None and self.run_id:
+                status = 'done' if success else 'stale' if message == STALE_MESSAGE else 'failed'
+                self._writer.mark(self.run_id, whl_port_code, status)
+            # 略過（未到期、304、讀到發布時間即中止）的港口沒有下載內容也沒有寫入
+            written += success and "已是最新" not in message
+            done += 1
+            print(f"[{done}/{total}] {whl_port_code}: {message}")
+        if written:
+            stats['unique_downloads'] += 1
+            stats['fanout_writes'] += written - 1
+        if check_priority:
+            self._check_priority_done(results)
+        return done
 
     def test_api_connection(self) -> None:
         """測試 API 連線和認證狀態"""
         print("\n🧪 測試 API 連線...")
         
         test_urls = [
-            "https://aedyn.weathernews.com/api/account/user",
-            "https://aedyn.weathernews.com/"
+            f"{AEDYN_BASE_URL}/api/account/user",
+            f"{AEDYN_BASE_URL}/"
         ]
         
         for url in test_urls:
@@ -770,6 +3616,409 @@ class PortWeatherCrawler:
         }
 
 
+class AsyncPortWeatherCrawler(PortWeatherCrawler):
+    """港口氣象資料爬蟲（asyncio 版本，單一事件迴圈處理大量站點）"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._http = None
+        self._auth_async_lock: Optional[asyncio.Lock] = None
+
+    def _open_http_session(self, concurrency: int):
+        """
+        建立共用連線的 aiohttp session
+        
+        Args:
+            concurrency: 同時進行中的連線數上限
+            
+        Returns:
+            aiohttp.ClientSession: 設定好的 session
+        """
+        try:
+            import aiohttp
+        except ImportError:
+            raise RuntimeError("AsyncPortWeatherCrawler 需要 aiohttp，請執行 pip install aiohttp")
+        
+        connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=concurrency, ssl=False)
+        return aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=TIMEOUT),
+                                     trace_configs=[self._trace_config(aiohttp)])
+
+    @staticmethod
+    def _trace_config(aiohttp: Any) -> Any:
+        """
+        建立記錄 DNS / 建立連線 / 回應標頭時間點的 aiohttp TraceConfig
+        
+        時間點寫入請求時傳入的 trace_request_ctx 字典（見 _timed_get_async）。
+        
+        Args:
+            aiohttp: aiohttp 模組
+            
+        Returns:
+            aiohttp.TraceConfig
+        """
+        def mark(name: str):
+            async def handler(session, context, params) -> None:
+                if context.trace_request_ctx is not None:
+                    context.trace_request_ctx[name] = time.perf_counter()
+            return handler
+        
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(mark('request_start'))
+        trace_config.on_dns_resolvehost_start.append(mark('dns_start'))
+        trace_config.on_dns_resolvehost_end.append(mark('dns_end'))
+        trace_config.on_connection_create_start.append(mark('connect_start'))
+        trace_config.on_connection_create_end.append(mark('connect_end'))
+        return trace_config
+
+    async def fetch_port_data_async(self, whl_port_code: str, retry_login: bool = True) -> Tuple[bool, str]:
+        """
+        非同步下載指定港口的氣象資料（fetch_port_data 的 asyncio 版本）
+        
+        Args:
+            whl_port_code: 港口代碼
+            retry_login: 當遇到權限錯誤時是否自動重新登入
+            
+        Returns:
+            Tuple[bool, str]: (成功與否, 訊息)
+        """
+        if whl_port_code not in self.port_map:
+            return False, f"找不到港口代碼: {whl_port_code}"
+        
+        if self._http is None:
+            # 單獨呼叫時臨時建立 session
+            self._http = self._open_http_session(ASYNC_CONCURRENCY)
+            self._auth_async_lock = asyncio.Lock()
+            try:
+                return (await self.fetch_station_data_async([whl_port_code], retry_login))[whl_port_code]
+            finally:
+                await self._http.close()
+                self._http = None
+        
+        return (await self.fetch_station_data_async([whl_port_code], retry_login))[whl_port_code]
+
+    async def fetch_station_data_async(self, whl_port_codes: List[str],
+                                       retry_login: bool = True) -> Dict[str, Tuple[bool, str]]:
+        """
+        非同步下載一個 WNI 站點的氣象資料（fetch_station_data 的 asyncio 版本，需已開啟 session）
+        
+        Args:
+            whl_port_codes: 共用同一站點 ID 的港口代碼列表
+            retry_login: 當遇到權限錯誤時是否自動重新登入
+            
+        Returns:
+            Dict[str, Tuple[bool, str]]: 各港口代碼的 (成功與否, 訊息)
+        """
+        sample = self._new_sample(whl_port_codes)
+        started = time.perf_counter()
+        results = await self._fetch_station_async(whl_port_codes, retry_login, sample)
+        self._finish_sample(sample, started, results)
+        return results
+
+    async def _fetch_station_async(self, whl_port_codes: List[str], retry_login: bool,
+                                   sample: Dict[str, Any]) -> Dict[str, Tuple[bool, str]]:
+        """
+        fetch_station_data_async 的實作，過程中把各階段量測填入 sample
+        
+        Args:
+            whl_port_codes: 共用同一站點 ID 的港口代碼列表
+            retry_login: 當遇到權限錯誤時是否自動重新登入
+            sample: 量測紀錄
+            
+        Returns:
+            Dict[str, Tuple[bool, str]]: 各港口代碼的 (成功與否, 訊息)
+        """
+        if self._deadline.expired():
+            return self._mark_stale(whl_port_codes)
+
+        p_info = self.port_map[whl_port_codes[0]]
+        url = self._port_url(p_info)
+        
+        def same(result: Tuple[bool, str]) -> Dict[str, Tuple[bool, str]]:
+            return {code: result for code in whl_port_codes}
+        
+        try:
+            generation = self._auth_generation
+            headers = await asyncio.to_thread(self._request_headers, whl_port_codes)
+            known_issued = await asyncio.to_thread(self._known_issued_time, whl_port_codes)
+            for attempt in range(MAX_RETRIES + 1):
+                grant = self.breaker.allow()
+                while not grant:
+                    wait = self._breaker_wait()
+                    if wait is None:
+                        return same((False, BREAKER_OPEN_MESSAGE))
+                    await asyncio.sleep(wait)
+                    grant = self.breaker.allow()
+                try:
+                    delay = self.rate_limiter.reserve()
+                    if delay >= self._deadline.remaining():
+                        raise DeadlineExceeded()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    try:
+                        status, response_headers, content, timing = await self._send_get_async(
+                            url, headers, known_issued)
+                    except Exception:
+                        # 連線失敗、逾時等皆視為 API 故障（因時間預算縮短逾時而中斷的除外）
+                        if not self._deadline.expired():
+                            self.breaker.record_failure()
+                        raise
+                    backoff = self._record_api_status(status, response_headers)
+                except BaseException:
+                    # 試探請求沒有記錄結果就結束（含取消）時釋放試探名額
+                    if grant == CircuitBreaker.PROBE:
+                        self.breaker.release_probe()
+                    raise
+                sample.update(timing, status=status, retries=attempt)
+                if backoff is None or attempt == MAX_RETRIES or self._deadline.expired():
+                    break
+                await asyncio.sleep(min(backoff * 2 ** attempt, self._deadline.remaining()))
+            
+            if status == 200 and content is None:
+                await asyncio.to_thread(self._remember_validators, whl_port_codes[0], response_headers)
+                return same((True, f"天氣資料已是最新 ({known_issued}，讀到發布時間即中止下載)"))
+            
+            elif status == 200:
+                # 解析與寫入資料庫交給執行緒，事件迴圈繼續處理其他下載
+                return await asyncio.to_thread(self._store_content, whl_port_codes, content, response_headers)
+            
+            elif status == 304:
+                return same((True, "天氣資料已是最新 (HTTP 304)"))
+            
+            elif status in [401, 403]:
+                if retry_login:
+                    # 先在事件迴圈內排隊，避免大量協程同時佔住執行緒池等待登入鎖
+                    async with self._auth_async_lock:
+                        refreshed = await asyncio.to_thread(self._refresh_after_auth_error, generation)
+                    if refreshed:
+                        return await self.fetch_station_data_async(whl_port_codes, retry_login=False)
+                return same((False, f"權限不足 (HTTP {status}) - Cookie 已過期"))
+            else:
+                return same((False, f"下載失敗 (HTTP {status})"))
+            
+        except DeadlineExceeded:
+            return self._mark_stale(whl_port_codes)
+        except asyncio.TimeoutError:
+            if self._deadline.expired():
+                return self._mark_stale(whl_port_codes)
+            return same((False, f"連線逾時（超過 {TIMEOUT} 秒）"))
+        except Exception as e:
+            return same((False, f"連線錯誤: {str(e)}"))
+
+    async def _read_bulletin_async(self, response: Any, known_issued: Optional[str]) -> Tuple[Optional[str], int]:
+        """
+        _read_bulletin 的 asyncio 版本
+        
+        Args:
+            response: aiohttp 回應
+            known_issued: 資料庫中的發布時間（None 表示一定要讀完）
+            
+        Returns:
+            Tuple[氣象內容（發布時間未變而中止下載時為 None）, 讀取的位元組數]
+        """
+        chunks = []
+        received = 0
+        checking = known_issued is not None
+        async for chunk in response.content.iter_chunked(STREAM_CHUNK_SIZE):
+            chunks.append(chunk)
+            received += len(chunk)
+            if not checking:
+                continue
+            unchanged = self._scan_header(b"".join(chunks), known_issued)
+            if unchanged is None:
+                continue
+            if not unchanged:
+                checking = False
+                continue
+            
+            remaining = (response.content_length or 0) - received
+            if 0 <= remaining <= STREAM_DRAIN_MAX_BYTES:
+                async for chunk in response.content.iter_chunked(STREAM_DRAIN_MAX_BYTES):
+                    received += len(chunk)
+            else:
+                response.close()
+            return None, received
+        return b"".join(chunks).decode(response.charset or "utf-8", errors="replace"), received
+
+    async def _timed_get_async(self, url: str, headers: Dict[str, str],
+                               known_issued: Optional[str] = None) -> Tuple[int, Any, Optional[str], Dict[str, Any]]:
+        """
+        送出 GET 並記錄成功回應的耗時
+        
+        Args:
+            url: 請求網址
+            headers: HTTP Headers
+            known_issued: 資料庫中的發布時間，開頭相同時中止下載
+            
+        Returns:
+            Tuple[狀態碼, 回應 Headers, 內容（僅 200 時；中止下載時為 None）,
+                  量測 {'dns_ms', 'connect_ms', 'ttfb_ms', 'body_ms', 'bytes'}]
+        """
+        trace: Dict[str, float] = {}
+        
+        async def get() -> Tuple[int, Any, Optional[str], int]:
+            async with self._http.get(url, headers=headers, trace_request_ctx=trace) as response:
+                trace['headers'] = time.perf_counter()
+                if response.status == 200:
+                    content, received = await self._read_bulletin_async(response, known_issued)
+                else:
+                    content, received = None, 0
+            return response.status, response.headers, content, received
+        
+        start = time.perf_counter()
+        status, response_headers, content, received = await asyncio.wait_for(get(), self._request_timeout())
+        end = time.perf_counter()
+        if status in (200, 304):
+            self.latency.record(end - start)
+        
+        def span(begin: str, finish: str) -> Optional[float]:
+            if begin in trace and finish in trace:
+                return round((trace[finish] - trace[begin]) * 1000, 1)
+            return None
+        
+        dns_ms = span('dns_start', 'dns_end')
+        connect_ms = span('connect_start', 'connect_end')
+        if connect_ms is not None and dns_ms is not None:
+            # aiohttp 的建立連線事件包含 DNS 查詢
+            connect_ms = round(connect_ms - dns_ms, 1)
+        ttfb_ms = span('connect_end' if 'connect_end' in trace else 'request_start', 'headers')
+        timing = {
+            'dns_ms': dns_ms,
+            'connect_ms': connect_ms,
+            'ttfb_ms': ttfb_ms,
+            'body_ms': round((end - trace['headers']) * 1000, 1) if 'headers' in trace else None,
+            'bytes': received,
+        }
+        return status, response_headers, content, timing
+
+    async def _send_get_async(self, url: str, headers: Dict[str, str],
+                              known_issued: Optional[str] = None) -> Tuple[int, Any, Optional[str], Dict[str, Any]]:
+        """
+        _send_get 的 asyncio 版本：超過等待門檻再送一份請求，先成功的勝出，落後的直接取消
+        
+        Args:
+            url: 請求網址
+            headers: HTTP Headers
+            known_issued: 資料庫中的發布時間，開頭相同時中止下載
+            
+        Returns:
+            Tuple[狀態碼, 回應 Headers, 內容（僅 200 時；中止下載時為 None）, 量測]
+        """
+        delay = self.latency.hedge_delay() if self._hedging else None
+        if delay is None:
+            return await self._timed_get_async(url, headers, known_issued)
+        
+        primary = asyncio.ensure_future(self._timed_get_async(url, headers, known_issued))
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+        
+        wait_slot = self.rate_limiter.reserve()
+        if wait_slot > 0:
+            await asyncio.sleep(wait_slot)
+        backup = asyncio.ensure_future(self._timed_get_async(url, headers, known_issued))
+        self._count_hedge('fired')
+        
+        pending = {primary, backup}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup:
+                            self._count_hedge('won')
+                        return task.result()
+            return primary.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def fetch_all_ports_async(self, concurrency: int = ASYNC_CONCURRENCY, use_schedule: bool = True,
+                                    hedge: bool = False, deadline: Optional[Deadline] = None,
+                                    resume: bool = False,
+                                    on_priority_done: Optional[Callable[[List[str]], None]] = None) -> Dict[str, int]:
+        """
+        非同步批次下載所有港口資料
+        
+        Args:
+            concurrency: 同時進行中的下載數上限
+            use_schedule: 是否略過下一次發布尚未到期的港口
+            hedge: 回應慢於本次批次 HEDGE_PERCENTILE 百分位數時是否再送一份請求
+            deadline: 時間預算（用完後其餘港口記入 stale_ports）
+            resume: 是否接續中斷的批次下載
+            on_priority_done: 上次有風險的港口全部下載完成時呼叫（在事件迴圈中執行，不可阻塞）
+            
+        Returns:
+            Dict[str, int]: 統計結果（鍵值同 PortWeatherCrawler.fetch_all_ports）
+        """
+        self._begin_deadline(deadline)
+        self._on_priority_done = on_priority_done
+        self.fetch_metrics = FetchMetrics()
+        self.breaker.rearm()
+        await asyncio.to_thread(self._ensure_token_for_run)
+        pending, stats = await asyncio.to_thread(self._plan_ports, use_schedule, resume)
+        stations = self.group_by_station(pending)
+        total = len(pending)
+        print(f"\n🚀 開始更新全部港口資訊，預計更新 {total} 個港口資料"
+              f"（{len(stations)} 個站點，asyncio 併發數: {concurrency}）...\n")
+        
+        semaphore = asyncio.Semaphore(concurrency)
+        done = 0
+
+        async def worker(whl_port_codes: List[str]) -> None:
+            nonlocal done
+            async with semaphore:
+                results = await self.fetch_station_data_async(whl_port_codes)
+            done = self._tally_station(stats, results, done, total, check_priority=False)
+            if self._priority_ready(results):
+                # 寫入資料庫交給執行緒，不阻擋其他進行中的下載
+                if self._writer is not None:
+                    await asyncio.to_thread(self._writer.flush)
+                self._notify_priority_done()
+
+        start_time = time.perf_counter()
+        self._run_requests_start = self.rate_limiter.requests
+        self._begin_hedging(hedge)
+        self._start_writer()
+        self._http = self._open_http_session(concurrency)
+        self._auth_async_lock = asyncio.Lock()
+        try:
+            await asyncio.gather(*(worker(whl_port_codes) for whl_port_codes in stations))
+        finally:
+            await self._http.close()
+            self._http = None
+            self._end_hedging(stats)
+            await asyncio.to_thread(self._finish_writer, stats)
+            self._deadline = Deadline()
+            self._last_run_seconds = time.perf_counter() - start_time
+        
+        await asyncio.to_thread(self.db.finish_crawl_run, self.run_id)
+        self._print_run_summary(stats)
+        return stats
+
+    def fetch_all_ports(self, max_workers: int = ASYNC_CONCURRENCY, use_schedule: bool = True,
+                        hedge: bool = False, deadline: Optional[Deadline] = None,
+                        resume: bool = False,
+                        on_priority_done: Optional[Callable[[List[str]], None]] = None) -> Dict[str, int]:
+        """
+        以 asyncio 引擎批次下載所有港口資料（與 PortWeatherCrawler 介面相容）
+        
+        Args:
+            max_workers: 同時進行中的下載數上限
+            use_schedule: 是否略過下一次發布尚未到期的港口
+            hedge: 回應過慢時是否再送一份請求
+            deadline: 時間預算
+            resume: 是否接續中斷的批次下載
+            on_priority_done: 上次有風險的港口全部下載完成時呼叫
+            
+        Returns:
+            Dict[str, int]: 統計結果（鍵值同 PortWeatherCrawler.fetch_all_ports）
+        """
+        return asyncio.run(self.fetch_all_ports_async(
+            concurrency=max_workers, use_schedule=use_schedule, hedge=hedge, deadline=deadline, resume=resume,
+            on_priority_done=on_priority_done
+        ))
+
+
 # ================= 使用範例 =================
 if __name__ == "__main__":
     # 從環境變數或設定檔讀取帳號密碼（更安全的做法）